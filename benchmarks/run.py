@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Runs the benchmarks
+#
+# Builds each synthetic schematic at each size, measuring the time taken to
+# construct it, the time taken by close(), the peak memory used and the size
+# of the output.  The results are written as JSON so that they can be compared
+# against those from another version of svg_schematic.
+#
+# Run from the top-level directory:
+#     python -m benchmarks.run -o results.json
+#     python -m benchmarks.run -o new.json --compare results.json
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from inform import Error, display, fatal, os_error
+import svg_schematic
+from svg_schematic import Schematic
+from .schematics import SCHEMATICS
+
+SIZES = [100, 1_000, 10_000, 100_000]
+# the sizes used for schematics that cannot use the default sizes; routing is
+# superlinear in the size of the schematic, so larger sizes take too long
+SCHEMATIC_SIZES = dict(
+    routed_blocks = [100, 1_000],
+)
+OPTIONS = '''
+    share_symbols streaming deferred auto_dots hop_overs clip_wires layers
+    style_classes compact
+'''.split()
+
+
+# build() {{{1
+def build(generator, n, filename, options):
+    # Builds one schematic, returns the number of components and the time
+    # taken to construct it and to close it.
+    start = time.perf_counter()
+    schematic = Schematic(filename=filename, **options)
+    try:
+        components = generator(n)
+    except BaseException:
+        schematic._deactivate()
+        raise
+    built = time.perf_counter()
+    schematic.close()
+    closed = time.perf_counter()
+    return components, built - start, closed - built
+
+
+# measure() {{{1
+def measure(name, n, directory, options, repeat=1):
+    # Times are the best of repeat runs.  Peak memory is measured in a separate
+    # run as tracemalloc slows everything down.
+    generator = SCHEMATICS[name]
+    filename = os.path.join(directory, '{}-{}.svg'.format(name, n))
+    construct = close = float('inf')
+    for i in range(repeat):
+        gc.collect()
+        components, t_construct, t_close = build(generator, n, filename, options)
+        construct = min(construct, t_construct)
+        close = min(close, t_close)
+    size = os.path.getsize(filename)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        build(generator, n, filename, options)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    os.remove(filename)
+
+    return dict(
+        schematic = name,
+        size = n,
+        components = components,
+        construct = construct,
+        close = close,
+        total = construct + close,
+        peak_memory = peak,
+        output_bytes = size,
+    )
+
+
+# compare() {{{1
+def compare(results, baseline):
+    # Reports how each result changed relative to the matching one in baseline.
+    def key(r):
+        return r['schematic'], r['size']
+    previous = {key(r): r for r in baseline['results']}
+    display('{:<16} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'schematic', 'size', 'construct', 'close', 'memory', 'output'
+    ))
+    for result in results['results']:
+        old = previous.get(key(result))
+        if not old:
+            continue
+        ratios = [
+            result[k] / old[k] if old[k] else float('nan')
+            for k in ['construct', 'close', 'peak_memory', 'output_bytes']
+        ]
+        display('{:<16} {:>7} {:>8.2f}x {:>8.2f}x {:>8.2f}x {:>8.2f}x'.format(
+            result['schematic'], result['size'], *ratios
+        ))
+
+
+# main() {{{1
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog = 'python -m benchmarks.run',
+        description = 'Benchmark svg_schematic using synthetic schematics.',
+    )
+    parser.add_argument(
+        '-s', '--schematic', action='append', choices=sorted(SCHEMATICS),
+        help = 'schematic to build, may be repeated (default: all)',
+    )
+    parser.add_argument(
+        '-n', '--size', action='append', type=int,
+        help = 'number of components, may be repeated (default: {}{})'.format(
+            ', '.join(str(s) for s in SIZES),
+            ''.join(
+                '; {}: {}'.format(k, ', '.join(str(s) for s in v))
+                for k, v in sorted(SCHEMATIC_SIZES.items())
+            )
+        ),
+    )
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=1,
+        help = 'number of timing runs, the fastest is reported (default: 1)',
+    )
+    parser.add_argument(
+        '--option', action='append', choices=OPTIONS, default=[],
+        help = 'Schematic option to enable, may be repeated',
+    )
+    parser.add_argument(
+        '--no-validate', action='store_true',
+        help = 'do not validate elements as they are created',
+    )
+    parser.add_argument(
+        '-o', '--output', help='write results to this JSON file',
+    )
+    parser.add_argument(
+        '-c', '--compare', metavar='JSON',
+        help = 'compare results against those in this JSON file',
+    )
+    cmdline = parser.parse_args(args)
+
+    options = {o: True for o in cmdline.option}
+    if cmdline.no_validate:
+        options['validate'] = False
+    results = dict(
+        version = svg_schematic.__version__,
+        python = platform.python_version(),
+        platform = platform.platform(),
+        date = time.strftime('%Y-%m-%dT%H:%M:%S'),
+        options = options,
+        results = [],
+    )
+    try:
+        baseline = None
+        if cmdline.compare:
+            with io.open(cmdline.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in cmdline.schematic or sorted(SCHEMATICS):
+                sizes = SCHEMATIC_SIZES.get(name, SIZES)
+                for n in cmdline.size or sizes:
+                    result = measure(name, n, directory, options, cmdline.repeat)
+                    results['results'].append(result)
+                    display(
+                        '{schematic:<16} {size:>7}: construct {construct:.3f}s, '
+                        'close {close:.3f}s, memory {peak_memory:,}B, '
+                        'output {output_bytes:,}B'.format(**result)
+                    )
+
+        if cmdline.output:
+            with io.open(cmdline.output, mode='w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        if baseline:
+            compare(results, baseline)
+    except OSError as e:
+        fatal(os_error(e))
+    except (Error, ValueError, KeyError) as e:
+        fatal(e)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# Synthetic schematics used by the benchmarks
+#
+# Each generator adds roughly n components to the active schematic, where a
+# component is a tile or a wire, and returns the number actually added.
+
+from svg_schematic import (
+    Amp, Box, Ground, Label, MOS, Pin, Resistor, Source, Wire
+)
+from math import ceil, sqrt
+
+
+# resistor_ladder() {{{1
+# An R-2R style ladder: a series resistor and a shunt resistor to ground per
+# rung, each connected with wires.
+def resistor_ladder(n):
+    count = 0
+    node = Pin(kind='in', name='in').t
+    while count < n:
+        series = Resistor(W=node, xoff=25, name='Rs', value='1k')
+        Wire([node, series.W])
+        shunt = Resistor(p=series.E, orient='v', name='Rp', value='2k')
+        Ground(t=shunt.n)
+        node = series.E
+        count += 4
+    return count
+
+
+# mos_array() {{{1
+# A square array of transistors whose gates are driven by row lines and whose
+# drains are joined by column lines.
+def mos_array(n):
+    side = max(ceil(sqrt(n / 3)), 1)
+    count = 0
+    for row in range(side):
+        previous = None
+        for col in range(side):
+            m = MOS(C=(150*col, 150*row), kind='n' if (row + col) % 2 else 'p')
+            if previous:
+                Wire([previous.g, m.g], kind='-|-')
+                Wire([previous.d, m.d], kind='|-|')
+                count += 2
+            previous = m
+            count += 1
+    return count
+
+
+# signal_chain() {{{1
+# The receiver from the examples, a long chain of amplifiers, filters and
+# mixers with their labels, replicated until it reaches the desired size.
+def signal_chain(n):
+    count = 0
+    y = 0
+    while count < n:
+        node = Pin(C=(0, y), kind='in', name='in', w=2).t
+        count += 1
+        for stage in range(8):
+            if stage in (3, 6):
+                mixer = Source(W=node, xoff=25, kind='mult')
+                lo = Source(p=mixer.S, yoff=50, kind='sine', name='LO')
+                Ground(t=lo.n)
+                Wire([mixer.S, lo.N])
+                Wire([node, mixer.W])
+                node = mixer.E
+                count += 5
+            else:
+                block = (Amp if stage % 2 else Box)(
+                    i=node, xoff=25, name='stage{}'.format(stage)
+                )
+                Label(C=block.S, loc='s', name='A=20dB')
+                Wire([node, block.i])
+                node = block.o
+                count += 3
+        out = Pin(t=node, xoff=50, kind='out', name='out')
+        w = Wire([node, out.t])
+        Label(C=w.m, kind='slash', loc='s', name='8')
+        count += 3
+        y += 200
+    return count
+
+
+# wire_mesh() {{{1
+# A dense grid of wires, each running horizontally then vertically to the
+# next grid point but one.  The wires overlap and meet at their vertices,
+# forming a single net with many junctions, but they almost never cross; the
+# crossings are exercised by wire_crossings.
+def wire_mesh(n):
+    side = max(ceil(sqrt(n)), 1)
+    count = 0
+    for row in range(side):
+        for col in range(side):
+            if count >= n:
+                return count
+            start = (50*col, 50*row)
+            end = (50*(col + 2), 50*(row + 2))
+            Wire([start, end], kind='-|' if (row + col) % 2 else '|-')
+            count += 1
+    return count
+
+
+# wire_crossings() {{{1
+# A grid of short horizontal and vertical wires, arranged so that each pair
+# crosses without connecting.
+def wire_crossings(n):
+    side = max(ceil(sqrt(n / 2)), 1)
+    count = 0
+    for row in range(side):
+        for col in range(side):
+            if count >= n:
+                return count
+            x, y = 50*col, 50*row
+            Wire([(x, y + 20), (x + 45, y + 20)])
+            Wire([(x + 30, y), (x + 30, y + 45)])
+            count += 2
+    return count
+
+
+# routed_blocks() {{{1
+# A grid of blocks, each output connected to the input of a nearby block with
+# an automatically routed wire, some inputs being driven by several outputs.
+def routed_blocks(n):
+    side = max(ceil(sqrt(n / 2)), 1)
+    blocks = [
+        [Box(C=(300*col, 300*row), w=2, h=1) for col in range(side)]
+        for row in range(side)
+    ]
+    count = side*side
+    steps = [(1, 0), (1, 1), (2, -1), (1, -2), (3, 0), (-2, 1)]
+    for row in range(side):
+        for col in range(side):
+            if count >= n:
+                return count
+            dc, dr = steps[(row + 2*col) % len(steps)]
+            if 0 <= col + dc < side and 0 <= row + dr < side:
+                Wire([blocks[row][col].o, blocks[row + dr][col + dc].i], kind='auto')
+                count += 1
+    return count
+
+
+SCHEMATICS = dict(
+    resistor_ladder = resistor_ladder,
+    mos_array = mos_array,
+    signal_chain = signal_chain,
+    wire_mesh = wire_mesh,
+    wire_crossings = wire_crossings,
+    routed_blocks = routed_blocks,
+)
@@ -28,8 +28,28 @@ __released__ = '2025-07-04'
 
 # Imports {{{1
 from svgwrite import Drawing
-from math import sqrt, atan2, pi
-from inform import Error, plural
+from svgwrite.elementfactory import ElementBuilder, factoryelements
+from svgwrite.etree import CDATA_TAG, CDATA_TPL
+from svgwrite.utils import is_string, iterflatlist, strlist
+from svgwrite.validator2 import get_validator
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from functools import partial, wraps
+from heapq import heapify, heappop, heappush
+import ast
+import gzip
+import hashlib
+import inspect
+import io
+import json
+import os
+import re
+import threading
+import time
+from string import digits
+from types import MappingProxyType
+from math import sqrt, atan2, inf, pi, cos, sin
+from inform import Error, display, error, os_error, plural, terminate, warn
 
 
 # Utilities {{{1
@@ -141,30 +161,811 @@ def offsets_to_coordinates(dest, x_offsets=None, y_offsets=None):
             dest[k + '_y'] = y
 
 
+# Output {{{1
+# The streaming writer produces the same output as svgwrite's pretty printer,
+# which passes the document through minidom.  These mimic minidom's formatting.
+STYLESHEET_TEMPLATE = (
+    '<?xml-stylesheet href="%s" type="text/css" '
+    'title="%s" alternate="%s" media="%s"?>\n'
+)
+
+# _escape() {{{2
+def _escape(data):
+    return data.replace(
+        "&", "&amp;").replace(
+        "<", "&lt;").replace(
+        '"', "&quot;").replace(
+        ">", "&gt;"
+    )
+
+# _attributes() {{{2
+def _attributes(items):
+    return ''.join(' {}="{}"'.format(k, _escape(v)) for k, v in items)
+
+# _is_text() {{{2
+def _is_text(node):
+    # minidom writes text and CDATA sections in line
+    return isinstance(node, str) or getattr(node, 'tag', None) == CDATA_TAG
+
+# _write_element() {{{2
+def _write_element(
+    write, indent, step, tag, attributes, nodes, write_node, newline='\n'
+):
+    # nodes are the contents of the element, strings are text and anything
+    # else; each is passed to write_node along with its indent, which is None
+    # if the node is to be written in line
+    write(indent + '<' + tag + attributes)
+    if not nodes:
+        write('/>' + newline)
+        return
+    if len(nodes) == 1 and _is_text(nodes[0]):
+        write('>')
+        write_node(nodes[0], None)
+    else:
+        write('>' + newline)
+        for node in nodes:
+            write_node(node, indent + step)
+        write(indent)
+    write('</' + tag + '>' + newline)
+
+# _write_xml() {{{2
+def _write_xml(xml, write, indent, step, precision=None):
+    # write an ElementTree element and its descendants, compactly if
+    # precision is given
+    newline = '\n' if precision is None else ''
+    def write_node(node, indent):
+        if isinstance(node, str):
+            write(_escape(node if indent is None else indent + node + newline))
+        elif node.tag == CDATA_TAG:
+            write(CDATA_TPL % node.text)
+        else:
+            _write_xml(node, write, indent, step, precision)
+
+    # ElementTree emits the namespace declarations before other attributes
+    tag = xml.tag
+    if precision is None:
+        items = sorted(
+            xml.attrib.items(), key=lambda item: not item[0].startswith('xmlns')
+        )
+    else:
+        tag, items = _compact_items(tag, xml.attrib.items(), precision)
+    nodes = ([xml.text] if xml.text else []) + list(xml)
+    _write_element(
+        write, indent, step, tag, _attributes(items), nodes, write_node, newline
+    )
+
+
+# Compact output {{{2
+# In compact output the numbers in these attributes are rounded and written in
+# their shortest form, and polylines and polygons are written as paths using
+# relative commands if that is shorter.
+COMPACT_ATTRIBUTES = frozenset('''
+    x y x1 y1 x2 y2 cx cy r rx ry width height points d transform viewBox
+    stroke-width font-size
+'''.split())
+NUMBER = re.compile(r'-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+PATH_TOKEN = re.compile(NUMBER.pattern + '|[A-Za-z]')
+
+# _round_number() {{{3
+def _round_number(value, precision):
+    # shortest form of value once rounded to precision decimal places
+    text = '{:.{}f}'.format(value, precision)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    return '0' if text == '-0' else text
+
+# _format_numbers() {{{3
+def _format_numbers(text, precision):
+    # rounds each of the numbers in text
+    return NUMBER.sub(
+        lambda match: _round_number(float(match.group()), precision), text
+    )
+
+# _format_path() {{{3
+def _format_path(path, precision):
+    # rounds the numbers in path data and removes the unneeded separators
+    parts = []
+    number = False
+    for token in PATH_TOKEN.findall(path):
+        if token.isalpha():
+            parts.append(token)
+            number = False
+            continue
+        token = _round_number(float(token), precision)
+        if number and not token.startswith('-'):
+            parts.append(' ')
+        parts.append(token)
+        number = True
+    return ''.join(parts)
+
+# _join_numbers() {{{3
+def _join_numbers(numbers):
+    # numbers are separated by a space unless the next has a sign
+    return ''.join(
+        n if i == 0 or n.startswith('-') else ' ' + n
+        for i, n in enumerate(numbers)
+    )
+
+# _relative_path() {{{3
+def _relative_path(points, precision, closed):
+    # the path that draws the same lines as the given polyline or polygon
+    # points, using relative commands and without repeating the command
+    # letter; the points are already rounded so the offsets between them are
+    # exact once rounded, and segments of no length are dropped as they draw
+    # nothing unless they are the only segment
+    numbers = [float(n) for n in NUMBER.findall(points)]
+    if len(numbers) < 4:
+        return None
+    x, y = numbers[0], numbers[1]
+    fmt = partial(_round_number, precision=precision)
+    path = ['M', _join_numbers([fmt(x), fmt(y)])]
+    previous = 'M'
+    for nx, ny in zip(numbers[2::2], numbers[3::2]):
+        dx, dy = round(nx - x, precision), round(ny - y, precision)
+        x, y = nx, ny
+        if dx == dy == 0:
+            continue
+        if dy == 0:
+            command, offsets = 'h', [fmt(dx)]
+        elif dx == 0:
+            command, offsets = 'v', [fmt(dy)]
+        else:
+            command, offsets = 'l', [fmt(dx), fmt(dy)]
+        offsets = _join_numbers(offsets)
+        if command != previous:
+            path.append(command)
+        elif not offsets.startswith('-'):
+            path.append(' ')
+        path.append(offsets)
+        previous = command
+    if previous == 'M':
+        path.append('h0')
+    if closed:
+        path.append('z')
+    return ''.join(path)
+
+# _compact_items() {{{3
+def _compact_items(tag, items, precision):
+    # returns the tag and the attributes of an element in compact form
+    attributes = dict(items)
+    for key in COMPACT_ATTRIBUTES.intersection(attributes):
+        if key == 'd':
+            attributes[key] = _format_path(attributes[key], precision)
+        else:
+            attributes[key] = _format_numbers(attributes[key], precision)
+    if tag in ('polyline', 'polygon') and 'points' in attributes:
+        points = attributes['points']
+        path = _relative_path(points, precision, tag == 'polygon')
+        # a path needs len('<polyline points=') - len('<path d=') fewer
+        # characters for its tag and attribute name
+        if path and len(path) < len(points) + len(tag) + 1:
+            tag = 'path'
+            del attributes['points']
+            attributes['d'] = path
+    items = sorted(
+        attributes.items(),
+        key = lambda item: (not item[0].startswith('xmlns'), item[0])
+    )
+    return tag, items
+
+
+# _write_if_changed() {{{2
+def _write_if_changed(filename, data):
+    # Writes data (bytes) to filename unless the file already holds exactly
+    # that data.  The file is replaced atomically, so readers never see
+    # a partially written file.  Returns True if the file was written.
+    try:
+        if os.path.getsize(filename) == len(data):
+            with io.open(filename, mode='rb') as f:
+                existing = hashlib.sha256(f.read()).digest()
+            if existing == hashlib.sha256(data).digest():
+                return False
+    except OSError:
+        pass
+    temp = '{}.{}.tmp'.format(filename, os.urandom(4).hex())
+    try:
+        with io.open(temp, mode='xb') as f:
+            f.write(data)
+        os.replace(temp, filename)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return True
+
+
+class Node: # {{{1
+    '''A lightweight record of an SVG element.
+
+    When a schematic is created with *deferred=True*, the element factory
+    methods of the schematic (*g*, *line*, *rect*, *circle*, *polyline*,
+    *polygon*, *path*, *text* and *use*) return nodes rather than svgwrite
+    elements.  A node simply records the arguments it was given.  The
+    corresponding svgwrite element is only constructed if needed, which is
+    never when the schematic is closed, as deferred schematics are always
+    written by streaming the nodes.
+
+    Nodes support the parts of the svgwrite element interface used when
+    drawing symbols: *add*, *translate*, *scale*, *rotate*, *push*, and
+    item access for attributes.
+    '''
+    __slots__ = ('elementname', 'args', 'extra', 'elements', 'transform', 'commands')
+
+    def __init__(self, elementname, *args, **extra):
+        self.elementname = elementname
+        self.args = args
+        self.extra = extra
+        self.elements = None
+        self.transform = None
+        self.commands = None
+
+    # add() {{{2
+    def add(self, element):
+        if self.elements is None:
+            self.elements = []
+        self.elements.append(element)
+        return element
+
+    # transformations {{{2
+    # these produce the same strings as svgwrite's Transform mixin
+    def _add_transformation(self, transform):
+        if self.transform:
+            transform = self.transform + ' ' + transform
+        self.transform = transform
+
+    def translate(self, tx, ty=None):
+        self._add_transformation("translate(%s)" % strlist([tx, ty]))
+
+    def rotate(self, angle, center=None):
+        self._add_transformation("rotate(%s)" % strlist([angle, center]))
+
+    def scale(self, sx, sy=None):
+        self._add_transformation("scale(%s)" % strlist([sx, sy]))
+
+    # push() {{{2
+    def push(self, *elements):
+        # path commands
+        if self.commands is None:
+            self.commands = []
+        self.commands.extend(elements)
+
+    # attributes {{{2
+    def __getitem__(self, key):
+        return self.attribs[key]
+
+    def __setitem__(self, key, value):
+        self.extra[key] = value
+
+    @property
+    def attribs(self):
+        """The SVG attributes of the element."""
+        geometry = NODE_GEOMETRY[self.elementname]
+        extra, attribs, commands, text = geometry(*self.args, **self.extra)
+        for key, value in extra.items():
+            key = key.rstrip('_').replace('_', '-')
+            attribs.setdefault(key, value)
+        if commands is not None:
+            attribs['d'] = str(strlist(commands + (self.commands or []), ' '))
+        if self.transform:
+            attribs['transform'] = self.transform
+        return attribs
+
+    # build() {{{2
+    def build(self, factory):
+        """Constructs the svgwrite element described by this node."""
+        builder = ElementBuilder(factoryelements[self.elementname], factory)
+        element = builder(*self.args, **self.extra)
+        if self.commands:
+            element.push(*self.commands)
+        if self.transform:
+            element['transform'] = self.transform
+        for child in self.elements or []:
+            if isinstance(child, Node):
+                child = child.build(factory)
+            element.add(child)
+        return element
+
+    # text() {{{2
+    @property
+    def text(self):
+        return NODE_GEOMETRY[self.elementname](*self.args, **self.extra)[3]
+
+
+# Node geometry {{{2
+# Each of these takes the arguments of the corresponding svgwrite element and
+# returns the unused arguments, the attributes derived from the arguments,
+# the path commands, and the text content, mimicking svgwrite.
+def _group(**extra):
+    return extra, {}, None, None
+
+def _line(start=(0, 0), end=(0, 0), **extra):
+    x1, y1 = start
+    x2, y2 = end
+    return extra, dict(x1=x1, y1=y1, x2=x2, y2=y2), None, None
+
+def _rect(insert=(0, 0), size=(1, 1), rx=None, ry=None, **extra):
+    x, y = insert
+    width, height = size
+    attribs = dict(x=x, y=y, width=width, height=height, rx=rx, ry=ry)
+    return extra, attribs, None, None
+
+def _circle(center=(0, 0), r=1, **extra):
+    cx, cy = center
+    return extra, dict(cx=cx, cy=cy, r=r), None, None
+
+def _polyline(points=[], **extra):
+    points = ' '.join('%s,%s' % (x, y) for x, y in points)
+    return extra, dict(points=points), None, None
+
+def _path(d=None, **extra):
+    return extra, {}, [d], None
+
+def _text(
+    text, insert=None, x=None, y=None, dx=None, dy=None, rotate=None, **extra
+):
+    if insert is not None:
+        x = [insert[0]]
+        y = [insert[1]]
+    attribs = {
+        k: strlist(list(iterflatlist(v)), ' ')
+        for k, v in dict(x=x, y=y, dx=dx, dy=dy, rotate=rotate).items()
+        if v is not None
+    }
+    return extra, attribs, None, text
+
+def _use(href, insert=None, size=None, **extra):
+    if not is_string(href):
+        href = '#' + href.get_id()
+    attribs = {'xlink:href': href}
+    if insert is not None:
+        attribs.update(x=insert[0], y=insert[1])
+    if size is not None:
+        attribs.update(width=size[0], height=size[1])
+    return extra, attribs, None, None
+
+NODE_GEOMETRY = dict(
+    g = _group,
+    line = _line,
+    rect = _rect,
+    circle = _circle,
+    polyline = _polyline,
+    polygon = _polyline,
+    path = _path,
+    text = _text,
+    use = _use,
+)
+
+
+class NullElement: # {{{1
+    '''Stands in for every element of a dry run.
+
+    It accepts the operations the components apply to their elements and
+    discards them.  Calling it, as the element factory does, returns it.
+    '''
+    __slots__ = ()
+    attribs = {}
+    elements = ()
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def add(self, element):
+        return element
+
+    def _discard(self, *args, **kwargs):
+        return self
+
+    translate = rotate = scale = push = _discard
+
+    def __getitem__(self, key):
+        return None
+
+    def __setitem__(self, key, value):
+        pass
+
+NULL_ELEMENT = NullElement()
+
+
+# Active schematic {{{1
+# Holds the schematic to which new components are added.
+try:
+    from contextvars import ContextVar
+except ImportError:
+    # context variables are not available before Python 3.7, fall back to
+    # a single global active schematic
+    class ContextVar:
+        def __init__(self, name, default=None):
+            self.name = name
+            self.value = default
+
+        def get(self):
+            return self.value
+
+        def set(self, value):
+            self.value = value
+
+active_schematic = ContextVar('active_schematic', default=None)
+
+# When a list, the names of the files written by Schematic.close() are
+# appended to it.  Used by build() to learn which files a script produces.
+written_files = None
+
+
+class Instrumentation: # {{{1
+    '''Statistics gathered while building a schematic.
+
+    Created when a schematic is created with *instrument=True* and available
+    as its *sch_instrumentation* attribute.  For each component class and kind
+    it records the number of instances created, the time spent constructing
+    them and in *set_coordinates*, the number of SVG elements they emitted,
+    and the number of bytes they contributed to the output.  It also records
+    the time taken by each phase of *close*.  The byte counts are only known
+    once the schematic is closed.
+    '''
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.phases = {}
+        self.depth = 0
+        self.set_coordinates_time = 0
+        self.hooked = False     # whether the constructors are instrumented
+
+    # component() {{{2
+    def component(self, component, kind, start, elapsed, spans, count):
+        # record a component, spans holds a (group, first, last) tuple for each
+        # group the component added elements to, first and last delimit the
+        # elements, count includes their descendants
+        self.events.append([
+            component.__class__.__name__, kind, start - self.origin, elapsed,
+            self.set_coordinates_time, spans, count, None
+        ])
+
+    # phase() {{{2
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (start - self.origin, time.perf_counter() - start)
+
+    # account() {{{2
+    def account(self, schematic):
+        # determine the number of bytes each component contributes to the output
+        for event in self.events:
+            output = []
+            for group, first, last in event[5]:
+                for element in (group.elements or [])[first:last]:
+                    schematic._stream_element(element, output.append, '  ', '  ')
+            event[7] = len(''.join(output).encode('utf-8'))
+
+    # components {{{2
+    @property
+    def components(self):
+        """Statistics for each component class and kind.
+
+        A dictionary keyed by (class name, kind) whose values are dictionaries
+        that hold *instances*, *init_time*, *set_coordinates_time*,
+        *elements*, and *bytes*.
+        """
+        components = {}
+        for event in self.events:
+            name, kind, start, elapsed, set_coords, spans, count, size = event
+            stats = components.setdefault((name, kind), dict(
+                instances=0, init_time=0, set_coordinates_time=0,
+                elements=0, bytes=None
+            ))
+            stats['instances'] += 1
+            stats['init_time'] += elapsed
+            stats['set_coordinates_time'] += set_coords
+            stats['elements'] += count
+            if size is not None:
+                stats['bytes'] = (stats['bytes'] or 0) + size
+        return components
+
+    # as_dict() {{{2
+    def as_dict(self):
+        """Returns the statistics in a form suitable for conversion to JSON."""
+        return dict(
+            components = [
+                dict(component=name, kind=kind, **stats)
+                for (name, kind), stats in sorted(
+                    self.components.items(), key=lambda item: str(item[0])
+                )
+            ],
+            phases = {k: v[1] for k, v in self.phases.items()},
+        )
+
+    # write_json() {{{2
+    def write_json(self, filename):
+        """Writes the statistics to filename as JSON."""
+        with io.open(filename, mode='w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    # write_trace() {{{2
+    def write_trace(self, filename):
+        """Writes the construction of each component and each phase of close
+        to filename in Chrome trace format, as read by chrome://tracing or
+        Perfetto."""
+        def event(name, category, start, elapsed, **args):
+            return dict(
+                name=name, cat=category, ph='X', pid=pid, tid=0,
+                ts=1e6*start, dur=1e6*elapsed, args=args
+            )
+        pid = os.getpid()
+        events = [
+            event(e[0], 'component', e[2], e[3], kind=e[1], bytes=e[7])
+            for e in self.events
+        ]
+        events += [
+            event(name, 'close', start, elapsed)
+            for name, (start, elapsed) in self.phases.items()
+        ]
+        with io.open(filename, mode='w', encoding='utf-8') as f:
+            json.dump(dict(traceEvents=events), f)
+
+
+# _count_elements() {{{2
+def _count_elements(elements):
+    count = 0
+    for element in elements:
+        count += 1 + _count_elements(getattr(element, 'elements', None) or [])
+    return count
+
+# _instrumentation() {{{2
+def _instrumentation():
+    # returns the instrumentation of the active schematic if it is enabled
+    schematic = active_schematic.get()
+    if schematic is None:
+        return None
+    return schematic.__dict__.get('sch_instrumentation')
+
+# _instrument_init() {{{2
+def _instrument_init(init):
+    # Wraps the constructor of a component so that it is recorded if the
+    # active schematic is instrumented.  Only the outermost constructor is
+    # recorded, those of the base classes are included in its time.
+    signature = inspect.signature(init)
+    kind_param = signature.parameters.get('kind')
+    default_kind = kind_param.default if kind_param else None
+
+    @wraps(init)
+    def wrapper(self, *args, **kwargs):
+        stats = _instrumentation()
+        if stats is None or stats.depth:
+            return init(self, *args, **kwargs)
+        schematic = active_schematic.get()
+        try:
+            kind = signature.bind(self, *args, **kwargs).arguments.get(
+                'kind', default_kind
+            )
+        except TypeError:
+            kind = default_kind
+        if kind is None:
+            kind = getattr(self, 'DEFAULT_KIND', None)
+        groups = [schematic] + list((schematic.sch_layers or {}).values())
+        marks = [len(group.elements or []) for group in groups]
+        stats.depth += 1
+        stats.set_coordinates_time = 0
+        start = time.perf_counter()
+        try:
+            init(self, *args, **kwargs)
+        finally:
+            stats.depth -= 1
+        elapsed = time.perf_counter() - start
+        if active_schematic.get() is schematic:
+            # otherwise this is a new schematic rather than a component
+            spans = []
+            elements = []
+            for group, first in zip(groups, marks):
+                added = (group.elements or [])[first:]
+                if added:
+                    spans.append((group, first, first + len(added)))
+                    elements.extend(added)
+            stats.component(
+                self, kind, start, elapsed, spans, _count_elements(elements)
+            )
+    wrapper.sch_original = init
+    return wrapper
+
+# _instrument_set_coordinates() {{{2
+def _instrument_set_coordinates(set_coordinates):
+    @wraps(set_coordinates)
+    def wrapper(self, *args, **kwargs):
+        stats = _instrumentation()
+        if stats is None:
+            return set_coordinates(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return set_coordinates(self, *args, **kwargs)
+        finally:
+            stats.set_coordinates_time += time.perf_counter() - start
+    wrapper.sch_original = set_coordinates
+    return wrapper
+
+# _hook_instrumentation() {{{2
+# The number of schematics being built with instrumentation.
+instrumented_schematics = 0
+instrumentation_lock = threading.Lock()
+
+def _hook_instrumentation(enable):
+    # The constructors of the components and Tile.set_coordinates are only
+    # wrapped while a schematic is being instrumented, so they cost nothing
+    # otherwise.  The wrappers record only for the instrumented schematics.
+    global instrumented_schematics
+    with instrumentation_lock:
+        instrumented_schematics += 1 if enable else -1
+        if enable or not instrumented_schematics:
+            _wrap_method(Tile, 'set_coordinates', _instrument_set_coordinates, enable)
+            classes = Schematic.__subclasses__()
+            while classes:
+                cls = classes.pop()
+                _wrap_method(cls, '__init__', _instrument_init, enable)
+                classes.extend(cls.__subclasses__())
+
+def _wrap_method(cls, name, wrap, enable):
+    # wraps or unwraps the named method if it is defined by cls
+    method = cls.__dict__.get(name)
+    original = getattr(method, 'sch_original', None)
+    if enable and method and not original:
+        setattr(cls, name, wrap(method))
+    elif not enable and original:
+        setattr(cls, name, original)
+
+# _no_phase() {{{2
+@contextmanager
+def _no_phase(name):
+    yield
+
+
+# Layers {{{1
+# The groups that hold the elements of a schematic that has layers, from
+# bottom to top.  The background, if any, is below them all.
+LAYERS = ('wires', 'symbols', 'text', 'annotations')
+
+
+# Style classes {{{1
+# The presentation attributes that are moved into a class if the schematic
+# uses style classes, and the order they are given in the style sheet.
+PRESENTATION_ATTRIBUTES = (
+    'fill', 'stroke', 'stroke_width', 'stroke_linecap', 'font_family', 'font_size'
+)
+LENGTH_PROPERTIES = ('stroke_width', 'font_size', 'line_width')
+
+# _style_role() {{{2
+def _style_role(declarations, background):
+    # name for a class given its declarations, those that differ only in
+    # their details, such as the line width or color, share a name and are
+    # distinguished by a number
+    if 'font_family' in declarations:
+        return 'text'
+    fill = declarations.get('fill', 'none')
+    stroke = declarations.get('stroke', 'none')
+    if stroke == 'none':
+        if fill == 'none':
+            return 'hidden'
+        return 'concealer' if fill == background else 'filled'
+    if fill == 'none':
+        return 'lead'
+    return 'body' if fill == background else 'filled'
+
+# _style_rule() {{{2
+def _style_rule(name, declarations):
+    properties = ';'.join(
+        '{}:{}'.format(key.replace('_', '-'), _css_value(key, value))
+        for key, value in declarations
+    )
+    return '.{}{{{}}}'.format(name, properties)
+
+# _css_value() {{{2
+def _css_value(key, value):
+    # lengths are given in user units, which must be explicit in a style sheet
+    if key in LENGTH_PROPERTIES and isinstance(value, (int, float)):
+        return '{}px'.format(value)
+    return value
+
+
+# Themes {{{1
+# Named bundles of the values that can be given by a theme.  Those a theme
+# does not give are taken from the schematic.  The media query selects when
+# the theme applies if it is not the first of the themes given to the
+# schematic.  Add to this dictionary to make other themes available by name.
+THEMES = dict(
+    light = dict(),
+    dark = dict(
+        color = '#e6e6e6',
+        background = '#1e1e1e',
+        media = '(prefers-color-scheme: dark)',
+    ),
+    print = dict(
+        color = 'black',
+        background = 'white',
+        media = 'print',
+    ),
+)
+THEME_PROPERTIES = (
+    'color', 'background', 'outline', 'line_width', 'font_family', 'font_size'
+)
+
+# _get_themes() {{{2
+def _get_themes(themes):
+    # themes may be a name, a dictionary, or a list of either
+    if isinstance(themes, (str, dict)):
+        themes = [themes]
+    resolved = []
+    for i, theme in enumerate(themes):
+        name = theme
+        if is_string(theme):
+            try:
+                theme = THEMES[name]
+            except KeyError:
+                raise Error('unknown theme.', culprit=name)
+        unknown = theme.keys() - set(THEME_PROPERTIES) - {'media'}
+        if unknown:
+            raise Error(
+                'unknown theme {}:'.format(plural(unknown).format('propert/y/ies')),
+                ', '.join(sorted(unknown)),
+                culprit = name if is_string(name) else i
+            )
+        if i and not theme.get('media'):
+            raise Error(
+                'theme has no media query, only the first may omit it.',
+                culprit = name if is_string(name) else i
+            )
+        resolved.append(theme)
+    return resolved
+
+# _theme_rule() {{{2
+def _theme_rule(theme, defaults=None):
+    # the rule that sets the custom properties for a theme; the default theme
+    # always applies and gives every property, taking those it does not give
+    # from defaults, the others only override it when their media matches
+    values = dict(defaults or {})
+    values.update(theme)
+    properties = ';'.join(
+        '--sch-{}:{}'.format(key.replace('_', '-'), _css_value(key, values[key]))
+        for key in THEME_PROPERTIES if key in values
+    )
+    rule = 'svg{{{}}}'.format(properties)
+    if defaults is None:
+        rule = '@media {}{{{}}}'.format(theme['media'], rule)
+    return rule
+
+
 class Schematic(Drawing): # {{{1
-    # Only one schematic is allowed at any one time.
     sch_LINE_WIDTH = 1
     sch_FONT_SIZE = 18
     sch_FONT_FAMILY = 'sans-serif'
     sch_DOT_RADIUS = 4
+    sch_HOP_RADIUS = 5
+    sch_ROUTE_PITCH = 25
+    sch_DRY_RUN = False
+    sch_PRECISION = 2
+    sch_COMPRESSION_LEVEL = 9
     sch_BACKGROUND = 'white'
     sch_OUTLINE = 'none'
-    sch_schematic = None
 
     # constructor {{{2
     def __init__(self, filename, *args, **kwargs):
-            # A design decision was made to only support one schematic at a
-            # time. This allows us to instantiate components without indicating
-            # which schematic they belong to.
-            # Could instead support multiple schematics, allowing you to pass in
-            # which schematic you want into each component, but instead have a
-            # global default schematic.  In that way you could support 'with
-            # Schematic():'. Then, the only global attribute schematic would
-            # support would be sch_schematic. The others would become instance
-            # attributes.
+        # Components are added to the active schematic, which avoids the need
+        # to indicate which schematic each component belongs to.  Creating
+        # a schematic makes it the active schematic, closing it restores the
+        # one that was active before.  The active schematic is held in
+        # a context variable, so each thread and each asyncio task has its
+        # own, which allows several schematics to be built concurrently.
         # Attributes that start with sch_ are the ones we are adding to the
         # Drawing data structure, the prefix is used to avoid name clashes.
-        Schematic.sch_schematic = self
+        # Themes are checked first so a bad one does not leave the schematic
+        # active.
+        themes = kwargs.pop('theme', None)
+        self.sch_themes = _get_themes(themes) if themes else None
+        self.sch_previous = active_schematic.get()
+        active_schematic.set(self)
+        self.sch_components = []
         self.sch_min_x = 9999
         self.sch_min_y = 9999
         self.sch_max_x = -9999
@@ -175,6 +976,54 @@ class Schematic(Drawing): # {{{1
         self.sch_dot_radius = kwargs.pop('dot_radius', Schematic.sch_DOT_RADIUS)
         self.sch_background = kwargs.pop('background', Schematic.sch_BACKGROUND)
         self.sch_outline = kwargs.pop('outline', Schematic.sch_OUTLINE)
+        self.sch_share_symbols = kwargs.pop('share_symbols', False)
+        self.sch_streaming = kwargs.pop('streaming', False)
+        self.sch_deferred = kwargs.pop('deferred', False)
+        self.sch_dry_run = kwargs.pop('dry_run', Schematic.sch_DRY_RUN)
+        self.sch_only_if_changed = kwargs.pop('only_if_changed', False)
+        compact = kwargs.pop('compact', None)
+        if compact is True:
+            compact = Schematic.sch_PRECISION
+        elif compact is False:
+            compact = None
+        self.sch_precision = compact    # decimal places if output is compact
+        compress = kwargs.pop('compress', None)
+        if compress is None:
+            compress = is_string(filename) and filename.endswith('.svgz')
+        if compress is True:
+            compress = Schematic.sch_COMPRESSION_LEVEL
+        elif compress is False:
+            compress = None
+        self.sch_compression = compress # gzip level if output is compressed
+        self.sch_written = False
+        self.sch_stats_file = kwargs.pop('stats_file', None)
+        self.sch_trace_file = kwargs.pop('trace_file', None)
+        instrument = kwargs.pop('instrument', False)
+        instrument = instrument or self.sch_stats_file or self.sch_trace_file
+        self.sch_instrumentation = Instrumentation() if instrument else None
+        if instrument:
+            _hook_instrumentation(True)
+            self.sch_instrumentation.hooked = True
+        self.sch_check = kwargs.pop('check', False)
+        self.sch_auto_dots = kwargs.pop('auto_dots', False)
+        self.sch_hop_overs = kwargs.pop('hop_overs', False)
+        self.sch_clip_wires = kwargs.pop('clip_wires', False)
+        layers = kwargs.pop('layers', False)
+        style_classes = kwargs.pop('style_classes', False)
+        if self.sch_themes:
+            # themes are expressed through the style sheet
+            style_classes = True
+        self.sch_styles = {} if style_classes else None  # classes by declarations
+        self.sch_route_pitch = kwargs.pop('route_pitch', Schematic.sch_ROUTE_PITCH)
+        self.sch_router = None
+        self.sch_spatial_index = None
+        self.sch_concealed = []     # regions hidden by components
+        self.sch_wire_breaks = {}   # breaks in wires by wire and segment
+        self.sch_hop_radius = kwargs.pop('hop_radius', Schematic.sch_HOP_RADIUS)
+        self.sch_validate = kwargs.pop('validate', True)
+        if self.sch_validate is not True:
+            # svgwrite only validates elements as they are created in debug mode
+            kwargs.setdefault('debug', False)
         pad = kwargs.pop('pad', 0)
         self.sch_left_pad = kwargs.pop('left_pad', 0) + pad
         self.sch_right_pad = kwargs.pop('right_pad', 0) + pad
@@ -188,47 +1037,782 @@ class Schematic(Drawing): # {{{1
             self.sch_background_group = self.g(id='bkgnd')
             self.add(self.sch_background_group)
 
+        # add a group for each layer, components add their elements to these
+        # rather than to the schematic
+        self.sch_layers = None
+        if layers:
+            self.sch_layers = {}
+            for name in LAYERS:
+                layer = self.sch_layers[name] = self.g(id=name)
+                self.add(layer)
+
+    # __init_subclass__() {{{2
+    def __init_subclass__(cls, **kwargs):
+        # instrument the constructors of components defined while a schematic
+        # is being instrumented
+        super().__init_subclass__(**kwargs)
+        if instrumented_schematics:
+            _wrap_method(cls, '__init__', _instrument_init, True)
+
+    # __getattr__() {{{2
+    def __getattr__(self, name):
+        # element factory, returns nodes rather than elements if deferred, the
+        # null element if a dry run, and moves the presentation attributes into
+        # classes if the schematic uses style classes
+        if self.__dict__.get('sch_styles') is not None and name in NODE_GEOMETRY:
+            return partial(self._styled, name, None)
+        return self._factory(name)
+
+    # _factory() {{{2
+    def _factory(self, name):
+        attributes = self.__dict__
+        if attributes.get('sch_dry_run') and name in factoryelements:
+            return NULL_ELEMENT
+        if name in NODE_GEOMETRY and attributes.get('sch_deferred'):
+            return partial(Node, name)
+        return super().__getattr__(name)
+
+    # _styled() {{{2
+    def _styled(self, name, role, *args, **extra):
+        # creates an element whose presentation attributes are replaced by
+        # a class; role names the class, it is derived from the declarations
+        # if not given
+        declarations = tuple(
+            (key, extra.pop(key)) for key in PRESENTATION_ATTRIBUTES
+            if key in extra
+        )
+        if declarations:
+            styles = self.sch_styles
+            cls = styles.get((role, declarations))
+            if not cls:
+                cls = role or _style_role(dict(declarations), self.sch_background)
+                count = sum(1 for c in styles.values() if c.rstrip(digits) == cls)
+                if count:
+                    cls += str(count + 1)
+                styles[role, declarations] = cls
+            if extra.get('class_'):
+                cls += ' ' + extra['class_']
+            extra['class_'] = cls
+        return self._factory(name)(*args, **extra)
+
+    # _add_styles() {{{2
+    def _add_styles(self):
+        # adds the style sheet that defines the classes used by the elements,
+        # preceded by the themes if there are any
+        rules = []
+        themed = self._themed if self.sch_themes else lambda k, v: v
+        for (role, declarations), cls in self.sch_styles.items():
+            declarations = [(k, themed(k, v)) for k, v in declarations]
+            rules.append(_style_rule(cls, declarations))
+        if self.sch_themes:
+            defaults = dict(
+                color = 'black',
+                background = self.sch_background,
+                outline = self.sch_outline,
+                line_width = self.sch_line_width,
+                font_family = self.sch_font_family,
+                font_size = self.sch_font_size,
+            )
+            default, *alternates = self.sch_themes
+            rules[:0] = [_theme_rule(default, defaults)] + [
+                _theme_rule(theme) for theme in alternates
+            ]
+        separator = '\n' if self.sch_precision is None else ''
+        self.defs.add(self.style(separator.join(rules)))
+
+    # _themed() {{{2
+    def _themed(self, key, value):
+        # replaces a value used by the schematic with the custom property that
+        # holds it; components draw in black, so black is the theme color, and
+        # line widths become multiples of the theme line width
+        if key in ('fill', 'stroke'):
+            if value == 'none':
+                return value
+            if value == 'black':
+                return 'var(--sch-color)'
+            if value == self.sch_background:
+                return 'var(--sch-background)'
+            if value == self.sch_outline:
+                return 'var(--sch-outline)'
+        elif key == 'stroke_width' and isinstance(value, (int, float)):
+            if not self.sch_line_width:
+                return value
+            scale = value / self.sch_line_width
+            if scale == 1:
+                return 'var(--sch-line-width)'
+            return 'calc({:g}*var(--sch-line-width))'.format(scale)
+        elif key == 'font_family' and value == self.sch_font_family:
+            return 'var(--sch-font-family)'
+        elif key == 'font_size' and value == self.sch_font_size:
+            return 'var(--sch-font-size)'
+        return value
+
+    # add() {{{2
+    def add(self, element):
+        # nothing is drawn in a dry run
+        if self.__dict__.get('sch_dry_run'):
+            return element
+        return super().add(element)
+
+    # sch_schematic {{{2
+    @property
+    def sch_schematic(self):
+        "The active schematic."
+        return active_schematic.get()
+
     # _update_bounds() {{{2
     def _update_bounds(self, min_x, min_y, max_x, max_y):
-        if self.sch_schematic.sch_min_x > min_x:
-            self.sch_schematic.sch_min_x = min_x
-        if self.sch_schematic.sch_min_y > min_y:
-            self.sch_schematic.sch_min_y = min_y
-        if self.sch_schematic.sch_max_x < max_x:
-            self.sch_schematic.sch_max_x = max_x
-        if self.sch_schematic.sch_max_y < max_y:
-            self.sch_schematic.sch_max_y = max_y
+        schematic = self.sch_schematic
+        if schematic.sch_min_x > min_x:
+            schematic.sch_min_x = min_x
+        if schematic.sch_min_y > min_y:
+            schematic.sch_min_y = min_y
+        if schematic.sch_max_x < max_x:
+            schematic.sch_max_x = max_x
+        if schematic.sch_max_y < max_y:
+            schematic.sch_max_y = max_y
 
     # set_active_schematic() {{{2
     @classmethod
     def set_active_schematic(cls, schematic):
-        cls.sch_schematic = schematic
+        active_schematic.set(schematic)
+
+    # _deactivate() {{{2
+    def _deactivate(self):
+        # restore the previously active schematic
+        if active_schematic.get() is self:
+            active_schematic.set(self.sch_previous)
+        self.sch_previous = None
+        stats = self.sch_instrumentation
+        if stats and stats.hooked:
+            stats.hooked = False
+            _hook_instrumentation(False)
+
+    # _share_symbols() {{{2
+    def _share_symbols(self):
+        # Replace each symbol group with a reference to a shared definition.
+        # Symbols are drawn in their own coordinate system and placed using the
+        # transform on the group, so identical symbols have identical contents
+        # regardless of where they are placed or how they are oriented.  The
+        # contents of the group are used as the key, so anything that affects
+        # the appearance of the symbol (kind, size, line width, color, etc.)
+        # results in a distinct definition.  If the schematic has layers, the
+        # symbol groups are the unnamed groups in the symbols and annotations
+        # layers.
+        if self.sch_layers:
+            containers = [self.sch_layers['symbols'], self.sch_layers['annotations']]
+            name = None
+        else:
+            containers = [self]
+            name = 'symbol'
+        definitions = {}
+        for container in containers:
+            elements = container.elements or []
+            for i, element in enumerate(elements):
+                if getattr(element, 'elementname', None) != 'g':
+                    continue
+                if element.attribs.get('id') != name:
+                    continue
+                if element.attribs.keys() - {'id', 'transform'}:
+                    continue
+                key = ''.join(self._serialize(child) for child in element.elements)
+                if key not in definitions:
+                    definition = self.g(id='symbol{}'.format(len(definitions)+1))
+                    for child in element.elements:
+                        definition.add(child)
+                    self.defs.add(definition)
+                    definitions[key] = definition
+                use = self.use('#' + definitions[key].attribs['id'])
+                if 'transform' in element.attribs:
+                    use['transform'] = element.attribs['transform']
+                elements[i] = use
+
+    # stream() {{{2
+    def stream(self, fileobj, indent=2):
+        """Writes schematic to fileobj, one element at a time.
+
+        Produces the same output as *save(pretty=True)*, but never holds
+        a second copy of the whole document in memory.  If the schematic is
+        compact, the output is compact and *indent* is ignored.
+        """
+        write = fileobj.write
+        newline = '\n' if self.sch_precision is None else ''
+        write('<?xml version="1.0" encoding="utf-8" ?>' + newline)
+        for stylesheet in self._stylesheets:
+            write((STYLESHEET_TEMPLATE % stylesheet).rstrip('\n') + newline)
+        self._stream_element(self, write, '', indent*' ')
+
+    # _stream_element() {{{2
+    def _stream_element(self, element, write, indent, step):
+        # compact output has no indentation, no line breaks and no empty
+        # groups
+        precision = self.sch_precision
+        newline = '\n'
+        if precision is not None:
+            indent = step = newline = ''
+            tag = getattr(element, 'elementname', None)
+            if tag == 'g' and not element.elements:
+                return
+
+        def write_node(node, indent):
+            if isinstance(node, str):
+                write(_escape(node if indent is None else indent + node + newline))
+            else:
+                self._stream_element(node, write, indent, step)
+
+        if isinstance(element, Node):
+            if element.elementname in NODE_GEOMETRY and self.profile == 'full':
+                tag = element.elementname
+                items = sorted(
+                    (k, str(v)) for k, v in element.attribs.items()
+                    if v is not None
+                )
+                items = [(k, v) for k, v in items if v]
+                if precision is not None:
+                    tag, items = _compact_items(tag, items, precision)
+                text = element.text
+                text = '' if text is None else str(text)
+                nodes = ([text] if text else []) + (element.elements or [])
+                _write_element(
+                    write, indent, step, tag, _attributes(items), nodes,
+                    write_node, newline
+                )
+                return
+            element = element.build(self)
+
+        children = getattr(element, 'elements', None)
+        if not children:
+            _write_xml(element.get_xml(), write, indent, step, precision)
+            return
+
+        # convert the element without its children, they are streamed below
+        element.elements = []
+        try:
+            xml = element.get_xml()
+        finally:
+            element.elements = children
+        tag = xml.tag
+        if precision is None:
+            items = sorted(
+                xml.attrib.items(),
+                key = lambda item: not item[0].startswith('xmlns')
+            )
+        else:
+            tag, items = _compact_items(tag, xml.attrib.items(), precision)
+        nodes = ([xml.text] if xml.text else []) + children
+        _write_element(
+            write, indent, step, tag, _attributes(items), nodes, write_node,
+            newline
+        )
+
+    # validate() {{{2
+    def validate(self):
+        """Checks the schematic against the SVG specification.
+
+        Performs the same checks svgwrite performs as each element is created
+        when *validate* is True, but on the finished schematic and all at once.
+        Raises Error if an attribute or child element is not valid.
+        """
+        validator = get_validator(self.profile, debug=True)
+        self._validate_element(self, validator, '')
+
+    # _validate_element() {{{2
+    def _validate_element(self, element, validator, path):
+        name = element.elementname
+        path = path + '/' + name
+        attribs = {k: v for k, v in element.attribs.items() if v is not None}
+        children = [
+            child for child in element.elements or []
+            if hasattr(child, 'elementname')
+        ]
+        try:
+            validator.check_all_svg_attribute_values(name, attribs)
+            for value in attribs.values():
+                if isinstance(value, (int, float)):
+                    validator.check_svg_type(value, 'number')
+            for child in children:
+                validator.check_valid_children(name, child.elementname)
+        except (TypeError, ValueError, KeyError) as e:
+            raise Error(str(e), culprit=path)
+        for child in children:
+            self._validate_element(child, validator, path)
+
+    # connectivity() {{{2
+    def connectivity(self, resolution=0.01):
+        """Determines which pins are connected.
+
+        Returns a *Connectivity* object that holds the nets of the schematic.
+        Locations closer than resolution are considered to be the same.
+        """
+        return Connectivity(self, resolution)
+
+    # spatial_index() {{{2
+    def spatial_index(self):
+        """Returns the spatial index of the schematic.
+
+        The *SpatialIndex* is held in *sch_spatial_index* and is created the
+        first time it is needed.  Thereafter it is brought up to date with the
+        components placed since it was last used.
+        """
+        if self.sch_spatial_index is None:
+            self.sch_spatial_index = SpatialIndex(self)
+        else:
+            self.sch_spatial_index.update()
+        return self.sch_spatial_index
+
+    # check() {{{2
+    def check(self, grid=None, resolution=0.01):
+        """Checks the schematic against a set of design rules.
+
+        Reports pins that connect to nothing, wire ends that land nowhere,
+        symbols that overlap, wires that pass through a symbol without
+        connecting to it, and wire vertices and connected pins that are not
+        on a grid with the given pitch, which defaults to half the width of
+        a unit tile.
+        A grid of 0 disables the last check.  Returns a list of *Violation*
+        objects, ordered by rule.  Locations closer than resolution are
+        considered to be the same.
+        """
+        if grid is None:
+            grid = Tile.UNIT_WIDTH/2
+        index = self.spatial_index()
+        connectivity = index.connectivity(resolution)
+        violations = list(_check_connections(connectivity, index, resolution))
+        violations.extend(_check_placement(index, resolution))
+        if grid:
+            violations.extend(_check_grid(connectivity, grid, resolution))
+        return violations
+
+    # add_junction_dots() {{{2
+    def add_junction_dots(self, resolution=0.01):
+        """Places a dot wherever three or more wires or pins meet.
+
+        This includes places where a wire tees into the middle of another.
+        No dot is added where there is already a pin or dot.  Returns the
+        dots added.
+        """
+        connectivity = self.connectivity(resolution)
+        pins = set(
+            connectivity._snap(c.center) for c in self.sch_components
+            if isinstance(c, Pin)
+        )
+        previous = active_schematic.get()
+        active_schematic.set(self)
+        try:
+            return [
+                Dot(C=location) for location in connectivity.junctions()
+                if connectivity._snap(location) not in pins
+            ]
+        finally:
+            active_schematic.set(previous)
+
+    # crossings() {{{2
+    def crossings(self, resolution=0.01):
+        """Finds the places where wires cross without connecting.
+
+        Two wires cross where they pass through each other at a point that is
+        not a vertex of either, as long as no wire vertex or pin falls there
+        to connect them.  Returns a list of (location, over, under) tuples,
+        where over and under are (wire, segment index) pairs.  The over
+        segment is the more nearly horizontal of the two, it is the one that
+        hops over the other.  Locations closer than resolution are considered
+        to be the same.
+        """
+        def snap(location):
+            x, y = location
+            return round(x/resolution), round(y/resolution)
+
+        segments = []
+        owners = []
+        connections = set()
+        for component in self.sch_components:
+            if isinstance(component, Wire):
+                points = [snap(p) for p in component.points]
+                connections.update(points)
+                for i, segment in enumerate(zip(points, points[1:])):
+                    segments.append(segment)
+                    owners.append((component, i))
+            else:
+                for name in component.pins:
+                    connections.add(snap(component.__dict__[name]))
+
+        def flatness(segment):
+            (x0, y0), (x1, y1) = segment
+            dx, dy = abs(x1 - x0), abs(y1 - y0)
+            return dx/(dx + dy)
+
+        crossings = []
+        for i, j, (x, y) in find_crossings(segments):
+            if (round(x), round(y)) in connections:
+                continue
+            if flatness(segments[i]) > flatness(segments[j]):
+                i, j = j, i
+            over, under = owners[j], owners[i]
+            if flatness(segments[j]) == 1 and flatness(segments[i]) == 0:
+                # use the given coordinates rather than the snapped ones
+                wire, segment = over
+                y = wire.points[segment][1]
+                wire, segment = under
+                x = wire.points[segment][0]
+            else:
+                x, y = x*resolution, y*resolution
+            crossings.append(((x, y), over, under))
+        return crossings
+
+    # route() {{{2
+    def route(self, *points):
+        """Finds a Manhattan route through the given points.
+
+        The route avoids the tiles and does not join the pins and wires
+        already placed, except that it may start or end on the wires already
+        attached to its first or last point.  Returns the vertices of the
+        route.  The router is
+        held in *sch_router* and is created the first time it is needed,
+        using *route_pitch* as the pitch of its grid.
+        """
+        if self.sch_router is None:
+            self.sch_router = Router(self, pitch=self.sch_route_pitch)
+        # a route that starts or ends on a pin that already has wires may
+        # join them instead, as long as the legs stay connected
+        last = len(points) - 2
+        route = []
+        for i, (a, b) in enumerate(zip(points, points[1:])):
+            leg = self.sch_router.route(a, b, join_a=i == 0, join_b=i == last)
+            route.extend(leg[1:] if route else leg)
+        return route
+
+    # add_hop_overs() {{{2
+    def add_hop_overs(self, style='arc', radius=None, resolution=0.01):
+        """Draws the wires so they hop over the wires they cross.
+
+        style is either 'arc', in which case the over wire is drawn with
+        a semicircular hop at each crossing, or 'gap', in which case it is
+        drawn with a short break.  radius is the radius of the hop or half the
+        width of the gap, it defaults to *hop_radius*.  Returns the crossings
+        as given by *crossings*.
+        """
+        if style not in ('arc', 'gap'):
+            raise Error('unknown hop-over style.', culprit=style)
+        if radius is None:
+            radius = self.sch_hop_radius
+        crossings = self.crossings(resolution)
+        hops = {}
+        for location, (wire, segment), under in crossings:
+            hops.setdefault(wire, {}).setdefault(segment, []).append(location)
+
+        breaks = {}
+        for wire, segments in hops.items():
+            for i, locations in segments.items():
+                p, q = wire.points[i], wire.points[i+1]
+                dx, dy = q[0] - p[0], q[1] - p[1]
+                length = sqrt(dx*dx + dy*dy)
+                distances = sorted(
+                    ((x - p[0])*dx + (y - p[1])*dy)/length for x, y in locations
+                )
+                spans = breaks.setdefault(wire, {})[i] = []
+                for n, t in enumerate(distances):
+                    # shrink hops that would overrun a vertex or each other
+                    r = min(radius, t, length - t)
+                    if n:
+                        r = min(r, (t - distances[n-1])/2)
+                    if n + 1 < len(distances):
+                        r = min(r, (distances[n+1] - t)/2)
+                    spans.append((t - r, t + r, r if style == 'arc' else None))
+        self._break_wires(breaks)
+        return crossings
+
+    # _clip_wires() {{{2
+    def _clip_wires(self):
+        # Removes the parts of the wires that pass under the components created
+        # after them, or under any component if the schematic has layers, which
+        # are the parts that concealers would hide.  The concealed regions are
+        # placed in a grid index, so each wire segment is only tested against
+        # the regions in the grid cells it passes through.
+        concealed = self.sch_concealed
+        size = Tile.UNIT_WIDTH
+        grid = {}
+        for n, (x0, y0, x1, y1, order, polygon) in enumerate(concealed):
+            for i in range(int(x0//size), int(x1//size) + 1):
+                for j in range(int(y0//size), int(y1//size) + 1):
+                    grid.setdefault((i, j), []).append(n)
+
+        breaks = {}
+        for order, wire in enumerate(self.sch_components):
+            if not isinstance(wire, Wire):
+                continue
+            points = wire.points
+            for k, (p, q) in enumerate(zip(points, points[1:])):
+                candidates = set()
+                for i in range(int(min(p[0], q[0])//size), int(max(p[0], q[0])//size) + 1):
+                    for j in range(int(min(p[1], q[1])//size), int(max(p[1], q[1])//size) + 1):
+                        candidates.update(grid.get((i, j), ()))
+                spans = []
+                for n in candidates:
+                    region = concealed[n]
+                    if region[4] < order and not self.sch_layers:
+                        continue    # the wire is drawn over the component
+                    clipped = _clip_segment(p, q, region, region[5])
+                    if clipped:
+                        length = sqrt((q[0] - p[0])**2 + (q[1] - p[1])**2)
+                        spans.append((clipped[0]*length, clipped[1]*length, None))
+                if spans:
+                    breaks.setdefault(wire, {})[k] = spans
+        self._break_wires(breaks)
+
+    # _break_wires() {{{2
+    def _break_wires(self, breaks):
+        # Redraws wires with breaks.  breaks maps a wire to a dictionary that
+        # maps the index of a segment to a list of (start, end, radius)
+        # tuples, the distances along the segment where a break starts and
+        # ends.  A break with a radius is drawn as a hop, otherwise it is
+        # a gap.  Breaks accumulate, so wires can be both clipped and hopped.
+        # Hops that fall in a gap are dropped, wires left with nothing to
+        # draw are removed.
+        replaced = {}
+        groups = {}
+        for wire, segments in breaks.items():
+            accumulated = self.sch_wire_breaks.setdefault(wire, {})
+            for i, spans in segments.items():
+                accumulated.setdefault(i, []).extend(spans)
+            path = self._broken_wire_path(wire.points, accumulated)
+
+            # replace the polyline with a path, keeping its attributes
+            line = wire.sch_line
+            if line is None:
+                continue
+            if path is None:
+                new = None
+            else:
+                if isinstance(line, Node):
+                    attribs = dict(line.extra)
+                else:
+                    attribs = dict(line.attribs)
+                    attribs.pop('points', None)
+                    attribs.pop('d', None)
+                new = self.path(d=path, **attribs)
+            replaced[id(line)] = wire.sch_line = new
+            groups[id(wire.sch_group)] = wire.sch_group
+        for group in groups.values():
+            elements = [replaced.get(id(e), e) for e in group.elements]
+            group.elements = [e for e in elements if e is not None]
+        if not self.sch_layers:
+            # remove the groups of the wires that are completely hidden
+            self.elements = [
+                e for e in self.elements
+                if id(e) not in groups or e.elements
+            ]
+
+    # _broken_wire_path() {{{2
+    @staticmethod
+    def _broken_wire_path(points, breaks):
+        # returns the path data for a wire with breaks, or None if nothing of
+        # the wire remains
+        def point(x, y):
+            return '{},{}'.format(_format_number(x), _format_number(y))
+
+        def move(location):
+            if path[-1][0] == 'M':
+                path[-1] = 'M' + location
+            else:
+                path.append('M' + location)
+
+        path = ['M' + point(*points[0])]
+        for i, (p, q) in enumerate(zip(points, points[1:])):
+            spans = breaks.get(i)
+            if not spans:
+                path.append('L' + point(*q))
+                continue
+            dx, dy = q[0] - p[0], q[1] - p[1]
+            length = sqrt(dx*dx + dy*dy)
+            ux, uy = dx/length, dy/length
+            # arcs bulge upward, or to the left on vertical segments
+            sweep = 1 if ux > 0 or (ux == 0 and uy < 0) else 0
+            position = 0
+            for start, end, radius in sorted(spans):
+                end = min(end, length)
+                if end <= position or radius is not None and start < position:
+                    continue
+                if start > position:
+                    path.append('L' + point(p[0] + start*ux, p[1] + start*uy))
+                end_point = point(p[0] + end*ux, p[1] + end*uy)
+                if radius is None:
+                    move(end_point)
+                else:
+                    r = _format_number(radius)
+                    path.append('A{0},{0} 0 0,{1} {2}'.format(r, sweep, end_point))
+                position = end
+            if position < length:
+                path.append('L' + point(*q))
+        if path[-1][0] == 'M':
+            path.pop()
+        if len(path) < 2:
+            return None
+        return ' '.join(path)
+
+    # write_netlist() {{{2
+    def write_netlist(self, filename, format=None, resolution=0.01):
+        """Writes the netlist of the schematic to filename.
+
+        format is either 'spice' or 'json', if not given it is 'json' if
+        filename ends with .json and 'spice' otherwise.
+        """
+        if format is None:
+            format = 'json' if filename.lower().endswith('.json') else 'spice'
+        if format not in ('spice', 'json'):
+            raise Error('unknown netlist format.', culprit=format)
+        connectivity = self.connectivity(resolution)
+        with io.open(filename, mode='w', encoding='utf-8') as f:
+            if format == 'json':
+                connectivity.write_json(f)
+            else:
+                connectivity.write_spice(f, title=self.filename)
+
+    # _serialize() {{{2
+    def _serialize(self, element):
+        # returns element as a string
+        output = []
+        self._stream_element(element, output.append, '', '')
+        return ''.join(output)
+
+    # _build_nodes() {{{2
+    def _build_nodes(self, element):
+        # replace nodes with the svgwrite elements they describe
+        children = getattr(element, 'elements', None) or []
+        for i, child in enumerate(children):
+            if isinstance(child, Node):
+                children[i] = child.build(self)
+            else:
+                self._build_nodes(child)
 
     # close() {{{2
     def close(self, min_x=None, min_y=None, width=None, height=None):
         "Saves and closes schematic"
+        # the schematic is deactivated even if closing fails, so later
+        # components are not added to it
+        try:
+            return self._close(min_x, min_y, width, height)
+        finally:
+            self._deactivate()
+
+    # _close() {{{2
+    def _close(self, min_x, min_y, width, height):
+        stats = self.sch_instrumentation
+        phase = stats.phase if stats else _no_phase
+
+        if self.sch_check:
+            with phase('checks'):
+                grid = None if self.sch_check is True else self.sch_check
+                for violation in self.check(grid):
+                    warn(violation.message, culprit=violation.culprit)
+        if self.sch_auto_dots:
+            with phase('junctions'):
+                self.add_junction_dots()
+        if self.sch_dry_run:
+            # nothing was drawn, so there is nothing to write
+            return False
+        if self.sch_clip_wires:
+            with phase('clipping'):
+                self._clip_wires()
+        if self.sch_hop_overs:
+            with phase('crossings'):
+                style = 'arc' if self.sch_hop_overs is True else self.sch_hop_overs
+                self.add_hop_overs(style)
+
         # the arguments are deprecated, use padding when creating schematic
         # instead.
-        if width is None:
-            min_x = self.sch_min_x - self.sch_left_pad - self.sch_line_width
-            min_y = self.sch_min_y - self.sch_bottom_pad - self.sch_line_width
-            width = self.sch_max_x + self.sch_right_pad + self.sch_right_pad - min_x + 2*self.sch_line_width
-            height = self.sch_max_y + self.sch_top_pad + self.sch_bottom_pad - min_y + 2*self.sch_line_width
-        assert width > 0 and height > 0, "no components in schematic."
-            # may also fail if components do not update bounds
-
-        if self.sch_background != 'none' or self.sch_outline != 'none':
-            self.sch_background_group.add(
-                self.rect(
-                    (min_x, min_y), (width, height),
-                    fill = self.sch_background,
-                    stroke = self.sch_outline, stroke_width=1,
+        with phase('bounds'):
+            if width is None:
+                min_x = self.sch_min_x - self.sch_left_pad - self.sch_line_width
+                min_y = self.sch_min_y - self.sch_bottom_pad - self.sch_line_width
+                width = self.sch_max_x + self.sch_right_pad + self.sch_right_pad - min_x + 2*self.sch_line_width
+                height = self.sch_max_y + self.sch_top_pad + self.sch_bottom_pad - min_y + 2*self.sch_line_width
+            assert width > 0 and height > 0, "no components in schematic."
+                # may also fail if components do not update bounds
+
+        with phase('background'):
+            if self.sch_background != 'none' or self.sch_outline != 'none':
+                rect = self.rect
+                if self.sch_styles is not None:
+                    rect = partial(self._styled, 'rect', 'background')
+                self.sch_background_group.add(
+                    rect(
+                        (min_x, min_y), (width, height),
+                        fill = self.sch_background,
+                        stroke = self.sch_outline, stroke_width=1,
+                    )
                 )
-            )
 
-        self.viewbox(min_x, min_y, width, height)
-        self.save(pretty=True)
-        self.sch_schematic = None
+        if self.sch_share_symbols:
+            with phase('share_symbols'):
+                self._share_symbols()
+        if self.sch_styles:
+            with phase('styles'):
+                self._add_styles()
+
+        with phase('viewbox'):
+            self.viewbox(min_x, min_y, width, height)
+        if self.sch_validate == 'close':
+            with phase('validation'):
+                self.validate()
+        with phase('serialization'):
+            if self.sch_only_if_changed:
+                if self.sch_compression is None:
+                    buffer = io.StringIO()
+                    self._write(buffer)
+                    text = buffer.getvalue().replace('\n', os.linesep)
+                    data = text.encode('utf-8')
+                else:
+                    buffer = io.BytesIO()
+                    self._write_compressed(buffer)
+                    data = buffer.getvalue()
+                self.sch_written = _write_if_changed(self.filename, data)
+            elif self.sch_compression is not None:
+                with io.open(self.filename, mode='wb') as f:
+                    self._write_compressed(f)
+                self.sch_written = True
+            else:
+                with io.open(self.filename, mode='w', encoding='utf-8') as f:
+                    self._write(f)
+                self.sch_written = True
+        if stats:
+            stats.account(self)
+            if self.sch_stats_file:
+                stats.write_json(self.sch_stats_file)
+            if self.sch_trace_file:
+                stats.write_trace(self.sch_trace_file)
+        if written_files is not None:
+            written_files.append(os.path.abspath(self.filename))
+        return self.sch_written
+
+    # _write_compressed() {{{2
+    def _write_compressed(self, fileobj):
+        # writes the document to the binary fileobj, compressing it as it is
+        # written; the header holds neither the time nor the name, so the same
+        # schematic always gives the same file
+        with gzip.GzipFile(
+            filename = '', mode = 'wb', fileobj = fileobj, mtime = 0,
+            compresslevel = self.sch_compression,
+        ) as compressed:
+            f = io.TextIOWrapper(compressed, encoding='utf-8')
+            self._write(f)
+            f.flush()
+            f.detach()
+
+    # _write() {{{2
+    def _write(self, fileobj):
+        # compact output is only produced by the streaming writer, and
+        # compressed output uses it so the uncompressed document is never held
+        # in memory; deferred schematics use it so their nodes never need to
+        # be built into svgwrite elements, the result is the same
+        streaming = (
+            self.sch_streaming or self.sch_deferred
+            or self.sch_compression is not None
+        )
+        if streaming or self.sch_precision is not None:
+            self.stream(fileobj)
+        else:
+            self._build_nodes(self)
+            self.write(fileobj, pretty=True)
 
     def __enter__(self):
         return self
@@ -237,6 +1821,8 @@ class Schematic(Drawing): # {{{1
         if type is None:
             # don't close and therefore write the file if there is an exception
             self.close()
+        else:
+            self._deactivate()
 
 
 class Wire(Schematic): # {{{1
@@ -260,6 +1846,9 @@ class Wire(Schematic): # {{{1
             '-|-': lines are constrained to follow Manhattan geometry,
                 three line segments are inserted between each point if needed,
                 the first is horizontal and second falls at the midpoint.
+            'auto': lines are constrained to follow Manhattan geometry,
+                the route between each point is found automatically such
+                that it avoids the components already placed.
         line_width (num): the line width
         color (str): you can change the color to help with debugging
     '''
@@ -268,6 +1857,10 @@ class Wire(Schematic): # {{{1
     ):
         schematic = self.sch_schematic
         assert schematic, 'no active schematic'
+        if kind == 'auto':
+            points = schematic.route(*points)
+            kind = 'plain'
+        schematic.sch_components.append(self)
         lw = schematic.sch_line_width if line_width is None else line_width
 
         # update bounds
@@ -300,20 +1893,33 @@ class Wire(Schematic): # {{{1
                 new_points.append(p)
                 prev = p
             points = new_points
+        self.points = [tuple(p) for p in points]
 
         # draw wire
-        wire = schematic.g(id='wire')
-        line = schematic.polyline(
+        polyline = schematic.polyline
+        if schematic.sch_styles is not None:
+            polyline = partial(schematic._styled, 'polyline', 'wire')
+        line = polyline(
             points, fill='none',
             stroke_width=lw, stroke=color, stroke_linecap='round', **extra
         )
+        if schematic.sch_layers:
+            wire = schematic.sch_layers['wires']
+        else:
+            wire = schematic.g(id='wire')
+            schematic.add(wire)
         wire.add(line)
-        schematic.add(wire)
+        self.sch_group = wire
+        self.sch_line = line
 
 
 class Tile(Schematic): # {{{1
+    _templates = {}     # pin and offset tables shared by like components
+    _TEMPLATE_LIMIT = 1000  # the templates are discarded beyond this many
     UNIT_WIDTH = 50
     UNIT_HEIGHT = 50
+    SHORTED_PINS = ()   # pairs of pins that are connected within the symbol
+    USED_PINS = {}      # pins used by each kind, all are used by other kinds
     COORDINATE_OFFSETS = dict(
         C = (0, 0),
         N = (0, -1/2),
@@ -327,9 +1933,14 @@ class Tile(Schematic): # {{{1
     )
 
     # constructor {{{2
-    def __init__(self):
+    def __init__(self, orient='', kind=None, name=None, value=None):
         schematic = self.sch_schematic
         assert schematic, 'no active schematic'
+        schematic.sch_components.append(self)
+        self.orient = orient
+        self.kind = kind
+        self.name = name
+        self.value = value
         lw = schematic.sch_line_width
         w, h = size = self.size
         x0, y0 = self.center
@@ -347,14 +1958,35 @@ class Tile(Schematic): # {{{1
         )
 
         # Create groups that act as layers and attach to schematic
-        symbol = self.symbol = schematic.g(id='symbol')
+        # If the schematic has layers, the symbol goes in the symbols layer, or
+        # the annotations layer for pins and labels, and the text goes
+        # directly in the text layer.
+        layers = schematic.sch_layers
+        if layers:
+            symbol = self.symbol = schematic.g()
+            annotation = isinstance(self, (Pin, Label))
+            layers['annotations' if annotation else 'symbols'].add(symbol)
+        else:
+            symbol = self.symbol = schematic.g(id='symbol')
+            schematic.add(symbol)
         symbol.add(bounding_box)
-        schematic.add(symbol)
 
         # Text goes in its own layer so it is always on top, and so that won't
         # get rotated such that it always remains right side up.
-        text = self.text = schematic.g(id='text')
-        schematic.add(text)
+        if layers:
+            self.text = layers['text']
+        else:
+            text = self.text = schematic.g(id='text')
+            schematic.add(text)
+
+    # used_pins() {{{2
+    def used_pins(self):
+        """Returns the names of the pins that are used by this kind of component.
+
+        Some components offer pins that are only used by some of their kinds.
+        """
+        pins = self.USED_PINS.get(self.kind)
+        return self.pins.keys() if pins is None else pins.split()
 
     # add_text() {{{2
     def add_text(self, text, position, alignment):
@@ -387,24 +2019,110 @@ class Tile(Schematic): # {{{1
         )
         self.text.add(text)
 
-    # set_coordinates() {{{2
-    # finds the center and sets principle components as attributes
-    def set_coordinates(
-        self, kwargs, pins=None, orient='', rotate='', h=2, w=2, extra=False
-    ):
+    # add_concealer() {{{2
+    def add_concealer(self, insert, size, stroke_width=None, oriented=True):
+        # Concealers hide the wires that pass under the component.  They are
+        # given in symbol coordinates.  If the schematic clips wires, the
+        # concealed region is recorded instead and the wires are clipped to it
+        # when the schematic is closed.  oriented indicates whether the symbol
+        # is rotated and flipped along with the pins.
+        schematic = self.sch_schematic
+        if not schematic.sch_clip_wires:
+            if stroke_width is None:
+                paint = dict(stroke='none')
+            else:
+                paint = dict(
+                    stroke=schematic.sch_background, stroke_width=stroke_width
+                )
+            paint['fill'] = schematic.sch_background
+            concealer = schematic.rect(insert=insert, size=size, **paint)
+            self.symbol.add(concealer)
+            return
+
+        x0, y0 = insert
+        x1, y1 = x0 + size[0], y0 + size[1]
+        if stroke_width:
+            x0, y0 = x0 - stroke_width/2, y0 - stroke_width/2
+            x1, y1 = x1 + stroke_width/2, y1 + stroke_width/2
+        corners = [(x0, y0), (x1, y1)]
+        if oriented:
+            corners = self._orient_points(corners)
+        (x0, y0), (x1, y1) = corners
+        cx, cy = self.center
+        schematic.sch_concealed.append((
+            cx + min(x0, x1), cy + min(y0, y1), cx + max(x0, x1), cy + max(y0, y1),
+            len(schematic.sch_components) - 1, None
+        ))
+
+    # add_body_concealer() {{{2
+    def add_body_concealer(self, points):
+        # Bodies filled with the background hide the wires that pass under
+        # the component without a concealer.  That fails if the background is
+        # 'none', so if the schematic clips wires, the outline of the body is
+        # recorded as a concealed region.  points are the vertices of the
+        # outline, a convex polygon, given in symbol coordinates.
+        schematic = self.sch_schematic
+        if not schematic.sch_clip_wires:
+            return
+        cx, cy = self.center
+        points = [(cx + x, cy + y) for x, y in self._orient_points(points)]
+        area = sum(
+            x0*y1 - x1*y0
+            for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])
+        )
+        if area < 0:
+            points.reverse()
+        xs = [x for x, y in points]
+        ys = [y for x, y in points]
+        schematic.sch_concealed.append((
+            min(xs), min(ys), max(xs), max(ys),
+            len(schematic.sch_components) - 1, points
+        ))
+
+    # add_circular_body_concealer() {{{2
+    def add_circular_body_concealer(self, center, r, sides=16):
+        # Like add_body_concealer, but for a round body, which is approximated
+        # by a polygon with the given number of sides inscribed in the circle.
+        x, y = center
+        self.add_body_concealer([
+            (x + r*cos(2*pi*i/sides), y + r*sin(2*pi*i/sides))
+            for i in range(sides)
+        ])
+
+    # _orient_points() {{{2
+    def _orient_points(self, points):
+        # rotates and flips points given in symbol coordinates to match the
+        # orientation of the component
+        rotate, flip_x, flip_y = self._orientation
+        if rotate:
+            points = [(y, -x) for x, y in points]
+        if flip_x:
+            points = [(-x, y) for x, y in points]
+        if flip_y:
+            points = [(x, -y) for x, y in points]
+        return points
+
+    # _template() {{{2
+    def _template(self, pins, orient, rotate, w, h):
+        # returns the size, the pins scaled to the size, the orientation, and
+        # the offsets from the center of the oriented pins and the principle
+        # coordinates
         w = w*Tile.UNIT_WIDTH
         h = h*Tile.UNIT_HEIGHT
-        self.size = (w, h)
 
         # scale the pins to w & h
-        # self.pins is used internally, center and orientation are normalized
-        self.pins = {k: (w*v[0], h*v[1]) for k, v in pins.items()}
+        # the scaled pins are used internally, center and orientation are
+        # normalized
+        scaled = {k: (w*v[0], h*v[1]) for k, v in pins.items()}
 
         # rotate and flip pins about normalized center
         # rotate (v or h) is the rotation that requires rotation if requested.
         # Thus if a symbol is drawn horizontally, then rotate would be 'v'
-        pins = {}
-        for name, loc in self.pins.items():
+        orientation = (
+            bool(rotate and rotate in orient), '|' in orient, '-' in orient
+        )
+        oriented = {}
+        for name, loc in scaled.items():
             x, y = loc
             if rotate and rotate in orient:
                 x, y = y, -x
@@ -412,13 +2130,38 @@ class Tile(Schematic): # {{{1
                 x = -x
             if '-' in orient:
                 y = -y
-            pins[name] = x, y
+            oriented[name] = x, y
 
         # scale the principle coordinates (C, N, NE, E, SE, ...)
         offsets = {k: (w*v[0], h*v[1]) for k, v in self.COORDINATE_OFFSETS.items()}
 
         # combine pins with principle components
-        offsets.update(pins)
+        offsets.update(oriented)
+        # the tables are shared, so they are made read-only
+        return (
+            (w, h), MappingProxyType(scaled), orientation,
+            MappingProxyType(offsets)
+        )
+
+    # set_coordinates() {{{2
+    # finds the center and sets principle components as attributes
+    def set_coordinates(
+        self, kwargs, pins=None, orient='', rotate='', h=2, w=2, extra=False
+    ):
+        # the pins and principle coordinates relative to the center depend only
+        # on the arguments, so they are computed once and kept as a template
+        key = (
+            self.__class__, tuple(pins.items()), orient, rotate, w, h,
+            Tile.UNIT_WIDTH, Tile.UNIT_HEIGHT
+        )
+        template = Tile._templates.get(key)
+        if template is None:
+            if len(Tile._templates) >= Tile._TEMPLATE_LIMIT:
+                Tile._templates.clear()
+            template = Tile._templates[key] = self._template(
+                pins, orient, rotate, w, h
+            )
+        self.size, self.pins, self._orientation, offsets = template
 
         # identify the location names in kwargs and compute the center
         location_names = offsets.keys() & kwargs.keys()
@@ -450,7 +2193,7 @@ class Tile(Schematic): # {{{1
 
         # translate pins and principle components and add as attributes
         self.__dict__.update({
-            k:(v[0]+x0, v[1]+y0) for k, v in offsets.items()
+            k: (dx + x0, dy + y0) for k, (dx, dy) in offsets.items()
         })
 
         # return unused kwargs if requested
@@ -490,7 +2233,7 @@ class Resistor(Tile): # {{{1
     def __init__(self, orient='h', name=None, value=None, nudge=5, **kwargs):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(p=(1/2, 0), n=(-1/2, 0)), orient, 'v')
-        super().__init__()
+        super().__init__(orient=orient, name=name, value=value)
 
         symbol = self.symbol
         schematic = self.sch_schematic
@@ -504,13 +2247,10 @@ class Resistor(Tile): # {{{1
         n = self.pins['n']
 
         # Concealer {{{2
-        concealer = schematic.rect(
+        self.add_concealer(
             insert = (-w/2+dr, -2*lw),
             size = (w-2*dr, 4*lw),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(concealer)
 
         # Resistor {{{2
         path = [n]
@@ -570,7 +2310,7 @@ class Capacitor(Tile): # {{{1
     def __init__(self, orient='v', name=None, value=None, nudge=5, **kwargs):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(p=(0, -1/2), n=(0, 1/2)), orient, 'h')
-        super().__init__()
+        super().__init__(orient=orient, name=name, value=value)
 
         symbol = self.symbol
         schematic = self.sch_schematic
@@ -584,13 +2324,10 @@ class Capacitor(Tile): # {{{1
         n = self.pins['n']
 
         # Concealer {{{2
-        concealer = schematic.rect(
+        self.add_concealer(
             insert = (-2*lw, -h/2+dr),
             size = (4*lw, w-2*dr),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(concealer)
 
         # Capacitor {{{2
         top_lead = schematic.line(
@@ -661,7 +2398,7 @@ class Inductor(Tile): # {{{1
     def __init__(self, orient='h', name=None, value=None, nudge=5, **kwargs):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(p=(1/2, 0), n=(-1/2, 0)), orient, 'v')
-        super().__init__()
+        super().__init__(orient=orient, name=name, value=value)
 
         symbol = self.symbol
         schematic = self.sch_schematic
@@ -679,13 +2416,10 @@ class Inductor(Tile): # {{{1
         n = self.pins['n']
 
         # Concealer {{{2
-        concealer = schematic.rect(
+        self.add_concealer(
             insert = (-w/2+dr, -2*lw),
             size = (w-2*dr, 4*lw),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(concealer)
 
         # Inductor {{{2
         x = -xinc*(undulations/2 - 0.5)
@@ -759,7 +2493,7 @@ class Diode(Tile): # {{{1
     ):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(a=(0, -1/2), c=(0, 1/2)), orient, 'h')
-        super().__init__()
+        super().__init__(orient=orient, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -771,13 +2505,10 @@ class Diode(Tile): # {{{1
         c = self.pins['c']
 
         # Concealer {{{2
-        concealer = schematic.rect(
+        self.add_concealer(
             insert = (-2*lw, -h/2+dr),
             size = (4*lw, w-2*dr),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(concealer)
 
         # Diode {{{2
         top_lead = schematic.line(
@@ -854,7 +2585,7 @@ class BJT(Tile): # {{{1
         else:
             pins = dict(c=(1/2, -1/2), b=(-1/2, 0), e=(1/2, 1/2))
         self.set_coordinates(kwargs, pins, orient, 'h')
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         assert self.size[0] == self.size[1]
@@ -871,13 +2602,10 @@ class BJT(Tile): # {{{1
 
         # Concealers {{{2
         # These are use to hide wiring that pass under component.
-        ce_concealer = schematic.rect(
+        self.add_concealer(
             insert = (w/2-2*lw, -h/2+dr),
             size = (4*lw, h-2*dr),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(ce_concealer)
         # b_concealer = schematic.rect(
         #     insert = (-w/2+dr, -2*lw),
         #     size = (w-2*dr, 4*lw),
@@ -998,7 +2726,7 @@ class MOS(Tile): # {{{1
         else:
             pins = dict(d=(1/2, -1/2), g=(-1/2, 0), s=(1/2, 1/2))
         self.set_coordinates(kwargs, pins, orient, 'h')
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         assert self.size[0] == self.size[1]
@@ -1015,13 +2743,10 @@ class MOS(Tile): # {{{1
 
         # Concealers {{{2
         # These are use to hide wiring that pass under component.
-        ds_concealer = schematic.rect(
+        self.add_concealer(
             insert = (w/2-2*lw, -h/2+dr),
             size = (4*lw, h-2*dr),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(ds_concealer)
         # g_concealer = schematic.rect(
         #     insert = (-w/2+dr, -2*lw),
         #     size = (w-2*dr, 4*lw),
@@ -1137,6 +2862,9 @@ class Amp(Tile): # {{{1
         off (xy location), xoff (real), yoff (real):
             Specify the offset from the specified location.
     '''
+
+    USED_PINS = dict(se='i o', oa='pi ni o', comp='pi ni o', da='pi ni po no')
+
     def __init__(
         self, kind='se', orient='h', name=None, value=None, w=2, h=2, **kwargs
     ):
@@ -1150,7 +2878,7 @@ class Amp(Tile): # {{{1
             no = ( 1/2, -1/4),
         )
         self.set_coordinates(kwargs, pins, orient, 'v', w=w, h=h)
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -1161,27 +2889,32 @@ class Amp(Tile): # {{{1
 
         # Draw symbol {{{2
         if isinstance(self, Converter):
+            outline = [
+                ( w/2,  0),
+                (   0, -h/2),
+                (-w/2, -h/2),
+                (-w/2, +h/2),
+                (   0, +h/2),
+            ]
             converter = schematic.polygon(
-                [   ( w/2,  0),
-                    (   0, -h/2),
-                    (-w/2, -h/2),
-                    (-w/2, +h/2),
-                    (   0, +h/2),
-                ], fill=schematic.sch_background,
+                outline, fill=schematic.sch_background,
                 stroke_width=lw, stroke='black', stroke_linecap='round'
             )
             out_x = w/4
             symbol.add(converter)
         else:
+            outline = [
+                ( w/2,  0),
+                (-w/2, -h/2),
+                (-w/2, +h/2),
+            ]
             amp = schematic.polygon(
-                [   ( w/2,  0),
-                    (-w/2, -h/2),
-                    (-w/2, +h/2),
-                ], fill=schematic.sch_background,
+                outline, fill=schematic.sch_background,
                 stroke_width=lw, stroke='black', stroke_linecap='round'
             )
             out_x = 0
             symbol.add(amp)
+        self.add_body_concealer(outline)
         if kind in 'oa da comp'.split():
             minus = schematic.line(
                 start=(-w/2+delta, h/4),
@@ -1294,7 +3027,7 @@ class Gate(Tile): # {{{1
     ):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(i=(-1/2, 0), o=(1/2, 0)), orient, 'v')
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -1306,19 +3039,23 @@ class Gate(Tile): # {{{1
 
         # Gate {{{2
         assert kind == 'inv'
+        outline = [
+            ( inv_x/2-r,  0),
+            (-inv_x/2-r, -inv_y/2),
+            (-inv_x/2-r, +inv_y/2),
+        ]
         gate = schematic.polygon(
-            [   ( inv_x/2-r,  0),
-                (-inv_x/2-r, -inv_y/2),
-                (-inv_x/2-r, +inv_y/2),
-            ], fill=schematic.sch_background,
+            outline, fill=schematic.sch_background,
             stroke_width=lw, stroke='black', stroke_linecap='round'
         )
         symbol.add(gate)
+        self.add_body_concealer(outline)
         ball = schematic.circle(
             center=(inv_x/2, 0), r=r, fill=schematic.sch_background,
             stroke_width=lw, stroke='black',
         )
         symbol.add(ball)
+        self.add_circular_body_concealer((inv_x/2, 0), r)
         in_lead = schematic.line(
             start=(-w/2, 0), end=(-inv_x/2-r, 0),
             stroke_width=lw, stroke='black', stroke_linecap='round'
@@ -1374,7 +3111,7 @@ class Ground(Tile): # {{{1
     ):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(t=(0, 0)), orient, 'h', w=1, h=1)
-        super().__init__()
+        super().__init__(orient=orient, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -1451,13 +3188,16 @@ class Source(Tile): # {{{1
         off (xy location), xoff (real), yoff (real):
             Specify the offset from the specified location.
     '''
+
+    USED_PINS = dict(sum='', mult='')
+
     def __init__(
         self, kind='empty', orient='v', name=None, value=None, color='black',
         nudge=5, **kwargs
     ):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, dict(p=(1/2, 0), n=(-1/2, 0)), orient, 'v')
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         assert self.size[0] == self.size[1]
@@ -1471,15 +3211,18 @@ class Source(Tile): # {{{1
 
         # Source {{{2
         if kind in ('cv', 'ci'):
+            outline = [
+                (0, -dr-elong),
+                (dr-elong, 0),
+                (0, dr+elong),
+                (-dr+elong, 0),
+            ]
             source = schematic.polygon(
-                [   (0, -dr-elong),
-                    (dr-elong, 0),
-                    (0, dr+elong),
-                    (-dr+elong, 0),
-                ],
+                outline,
                 fill=schematic.sch_background,
                 stroke_width=lw, stroke=color, stroke_linecap='round'
             )
+            self.add_body_concealer(outline)
             src_t = (0, -dr-elong)
             src_b = (0,  dr+elong)
         else:
@@ -1487,6 +3230,7 @@ class Source(Tile): # {{{1
                 center=(0, 0), r=r, fill=schematic.sch_background,
                 stroke_width=lw, stroke=color
             )
+            self.add_circular_body_concealer((0, 0), r)
             src_t = (0, -r)
             src_b = (0,  r)
         symbol.add(source)
@@ -1692,14 +3436,14 @@ class Pin(Tile): # {{{1
         color='black', nudge=5, **kwargs
     ):
         # Initialization and parameters {{{2
+        if kind is None:
+            kind = self.DEFAULT_KIND
         self.set_coordinates(kwargs, dict(t=(0, 0)), orient, 'v', w=w, h=h)
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         schematic = self.sch_schematic
         symbol = self.symbol
         r = schematic.sch_dot_radius
         lw = schematic.sch_line_width
-        if kind is None:
-            kind = self.DEFAULT_KIND
 
         # Pin {{{2
         if kind != 'none':
@@ -1772,7 +3516,7 @@ class Label(Tile): # {{{1
     ):
         # Initialization and parameters {{{2
         self.set_coordinates(kwargs, {}, orient, 'v', w=w, h=h)
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         schematic = self.sch_schematic
         symbol = self.symbol
         lw = schematic.sch_line_width
@@ -1874,6 +3618,8 @@ class Box(Tile): # {{{1
             Specify the offset from the specified location.
     '''
 
+    USED_PINS = {None: ''}      # the pins are all optional
+
     def __init__(
         self, orient='h', name=None, value=None, nudge=5, line_width=None,
         background=None, w=2, h=1.5, **kwargs
@@ -1888,7 +3634,7 @@ class Box(Tile): # {{{1
             no = ( 1/2,  1/4),
         )
         extra = self.set_coordinates(kwargs, pins, orient, 'v', w=w, h=h, extra=True)
-        super().__init__()
+        super().__init__(orient=orient, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -1905,6 +3651,10 @@ class Box(Tile): # {{{1
             **extra
         )
         symbol.add(box)
+        if background != 'none':
+            self.add_body_concealer([
+                (-w/2, -h/2), (w/2, -h/2), (w/2, h/2), (-w/2, h/2)
+            ])
 
         # Orientation and translation {{{2
         # The transformation operations are performed by SVG in reverse order.
@@ -1945,6 +3695,8 @@ class Switch(Tile): # {{{1
             Specify the offset from the specified location.
     '''
 
+    USED_PINS = dict(spst='i o', spdt='i ot ob')
+
     def __init__(
         self, kind='spst', orient='h', name=None, value=None, dots=False,
         nudge=5, **kwargs
@@ -1952,7 +3704,7 @@ class Switch(Tile): # {{{1
         # Initialization and parameters {{{2
         pins = dict(i=(-1/2, 0), o=(1/2, 0), ot=(1/2, -1/4), ob=(1/2, 1/4))
         self.set_coordinates(kwargs, pins, orient, 'v')
-        super().__init__()
+        super().__init__(orient=orient, kind=kind, name=name, value=value)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -1967,13 +3719,10 @@ class Switch(Tile): # {{{1
 
         # Concealer {{{2
         # These are use to hide wiring that pass under component.
-        concealer = schematic.rect(
+        self.add_concealer(
             insert = (-gap/2, -sep/2-2*lw),
             size = (gap, sep+4*lw),
-            stroke = 'none',
-            fill = schematic.sch_background,
         )
-        symbol.add(concealer)
 
         # Switch {{{2
         switch = schematic.line(
@@ -2089,8 +3838,12 @@ class Crossing(Tile): # {{{1
 
     You will need to specify pass_under if the schematic background color is
     none.  You can set it to 'none' to eliminate the pass under concealer.
+    If the schematic clips wires, the wire that passes under is instead drawn
+    with a gap and pass_under is only used to eliminate the gap.
     '''
 
+    SHORTED_PINS = (('pi', 'po'), ('ni', 'no'))
+
     def __init__(self, orient='h', w=1, h=1, pass_under=None, **kwargs):
         # Initialization and parameters {{{2
         pins = dict(
@@ -2100,7 +3853,7 @@ class Crossing(Tile): # {{{1
             no = ( 1/2, -1/2),
         )
         self.set_coordinates(kwargs, pins, orient, 'v', w=w, h=h)
-        super().__init__()
+        super().__init__(orient=orient)
         symbol = self.symbol
         schematic = self.sch_schematic
         w, h = self.size
@@ -2109,30 +3862,38 @@ class Crossing(Tile): # {{{1
 
         # Concealer {{{2
         # These are use to hide wiring that pass under component.
-        concealer = schematic.rect(
+        self.add_concealer(
             insert = (-w/2, -h/2),
             size = self.size,
-            stroke = schematic.sch_background,
             stroke_width = 2*lw,
-            fill = schematic.sch_background,
+            oriented = False,
         )
-        symbol.add(concealer)
 
         # Crossing {{{2
         # wire from upper left to lower right
-        wire = schematic.line(
-            start=(-w/2, h/2), end=(w/2, -h/2),
-            stroke_width=lw, stroke='black',
-        )
-        symbol.add(wire)
+        if schematic.sch_clip_wires and pass_under != 'none':
+            # draw it in two pieces, leaving a gap where it passes under
+            d = sqrt(w*w + h*h)
+            dx, dy = r*w/d, r*h/d
+            for start, end in [((-w/2, h/2), (-dx, dy)), ((dx, -dy), (w/2, -h/2))]:
+                wire = schematic.line(
+                    start=start, end=end, stroke_width=lw, stroke='black',
+                )
+                symbol.add(wire)
+        else:
+            wire = schematic.line(
+                start=(-w/2, h/2), end=(w/2, -h/2),
+                stroke_width=lw, stroke='black',
+            )
+            symbol.add(wire)
 
-        # pass under concealer (a white dot)
-        pass_under_concealer = schematic.circle(
-            (0, 0), r=r,
-            stroke = 'none',
-            fill = pass_under or schematic.sch_background
-        )
-        symbol.add(pass_under_concealer)
+            # pass under concealer (a white dot)
+            pass_under_concealer = schematic.circle(
+                (0, 0), r=r,
+                stroke = 'none',
+                fill = pass_under or schematic.sch_background
+            )
+            symbol.add(pass_under_concealer)
 
         # wire from lower left to upper right
         wire = schematic.line(
@@ -2143,3 +3904,1897 @@ class Crossing(Tile): # {{{1
 
         # Orientation and translation {{{2
         symbol.translate(self.center)
+
+
+# Connectivity {{{1
+class DisjointSet: # {{{2
+    '''Union-find over the integers 0 to n-1.'''
+    __slots__ = ('parent', 'size')
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1]*n
+
+    def find(self, i):
+        "Returns the representative of the set that contains i."
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, i, j):
+        "Merges the sets that contain i and j."
+        i = self.find(i)
+        j = self.find(j)
+        if i == j:
+            return
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+
+
+class Net: # {{{2
+    '''A set of pins and wires that are connected.
+
+    Attributes:
+        name (str): the name of the net.
+        pins (list of (component, pin name)): the pins on the net.
+        wires (list of Wire): the wires that form the net; a wire that passes
+            under a component is on the nets on either side of it.
+        points (list of xy locations): the pin locations and wire vertices
+            on the net.
+    '''
+    __slots__ = ('name', 'pins', 'wires', 'points')
+
+    def __init__(self, name=None):
+        self.name = name
+        self.pins = []
+        self.wires = []
+        self.points = []
+
+    @property
+    def components(self):
+        "The components that have a pin on the net, in order."
+        components = {}
+        for component, pin in self.pins:
+            components[id(component)] = component
+        return list(components.values())
+
+    def __contains__(self, terminal):
+        component, pin = terminal
+        return any(c is component and p == pin for c, p in self.pins)
+
+    def __len__(self):
+        return len(self.pins)
+
+    def __repr__(self):
+        return '{}({!r}, {})'.format(
+            self.__class__.__name__, self.name,
+            ', '.join(
+                '{}.{}'.format(c.name or c.__class__.__name__, p)
+                for c, p in self.pins
+            )
+        )
+
+
+class Connectivity: # {{{2
+    '''The nets of a schematic.
+
+    Pins and wire vertices that fall at the same location are connected, as
+    are pins and wire vertices that fall on a wire, and all grounds.  Wires
+    that merely cross are not connected.  The part of a wire that runs straight from one pin of
+    a component to another of its pins, within the component, is concealed
+    by the component, and so does not connect the two pins.
+
+    Locations are snapped to a grid with the given resolution and placed in a
+    hash index.  Pins and vertices are then merged into nets using
+    a disjoint-set structure.  The points on each wire segment are found by
+    bisection, so the cost is close to linear in the size of the schematic.
+
+    Args:
+        schematic (Schematic): the schematic.
+        resolution (real): locations closer than this are considered the same.
+
+    Nets are named after the ground, pin or label found on them, in that
+    order of preference, otherwise they are given names of the form N1, N2,
+    etc.  Grounds are named 0.  Nets can be accessed by iterating over the
+    connectivity, by name, or by pin using *net*.
+    '''
+    def __init__(self, schematic, resolution=0.01):
+        self.resolution = resolution
+        self.components = schematic.sch_components
+        self.points = {}    # snapped location -> point
+        self.locations = [] # point -> location
+        self._nets = None
+        self._find_connections()
+
+    # _point() {{{3
+    def _point(self, location):
+        # returns the point at location, adding it if needed
+        key = self._snap(location)
+        point = self.points.get(key)
+        if point is None:
+            point = self.points[key] = len(self.locations)
+            self.locations.append(location)
+        return point
+
+    def _snap(self, location):
+        x, y = location
+        return round(x/self.resolution), round(y/self.resolution)
+
+    # _find_connections() {{{3
+    def _find_connections(self):
+        tiles = []
+        wires = []
+        for component in self.components:
+            if isinstance(component, Wire):
+                wires.append(component)
+            else:
+                tiles.append(component)
+
+        # pins at the same location are joined by sharing a point, all
+        # grounds are joined
+        pin_owners = {}
+        self.terminals = []
+        self.shorts = shorts = []
+        ground = None
+        for component in tiles:
+            for name in component.pins:
+                point = self._point(component.__dict__[name])
+                self.terminals.append((component, name, point))
+                pin_owners.setdefault(point, []).append(component)
+                if isinstance(component, Ground):
+                    if ground is None:
+                        ground = point
+                    shorts.append((ground, point))
+            for a, b in component.SHORTED_PINS:
+                shorts.append((
+                    self._point(component.__dict__[a]),
+                    self._point(component.__dict__[b])
+                ))
+        res = self.resolution
+        points = self.points
+        locations = self.locations
+        wire_points = []
+        for wire in wires:
+            vertices = []
+            for location in wire.points:
+                key = round(location[0]/res), round(location[1]/res)
+                point = points.get(key)
+                if point is None:
+                    point = points[key] = len(locations)
+                    locations.append(location)
+                vertices.append((key, point))
+            wire_points.append(vertices)
+
+        # index the points by their snapped x and y values, each line holds
+        # its points in order, and the position of each point in its row and
+        # column is recorded
+        columns = {}
+        rows = {}
+        for key, point in points.items():
+            columns.setdefault(key[0], []).append((key[1], point))
+            rows.setdefault(key[1], []).append((key[0], point))
+        position_in_column = [0]*len(locations)
+        position_in_row = [0]*len(locations)
+        for lines, positions in [
+            (columns, position_in_column), (rows, position_in_row)
+        ]:
+            for coord, line in lines.items():
+                line.sort()
+                for i, (c, point) in enumerate(line):
+                    positions[point] = i
+                lines[coord] = [c for c, p in line], [p for c, p in line]
+        column_coords = sorted(columns)
+
+        # find the points that fall on each wire segment, the pieces of wire
+        # between them join the points and are the branches that leave them,
+        # and the points touched by each wire are recorded
+        self.pieces = pieces = set()
+        self.wire_points = []
+        for wire, vertices in zip(wires, wire_points):
+            touched = [point for key, point in vertices]
+            self.wire_points.append((wire, touched))
+            for ((x0, y0), a), ((x1, y1), b) in zip(vertices, vertices[1:]):
+                if x0 == x1:
+                    i, j = position_in_column[a], position_in_column[b]
+                    line = columns[x0][1]
+                elif y0 == y1:
+                    i, j = position_in_row[a], position_in_row[b]
+                    line = rows[y0][1]
+                else:
+                    i = j = None
+                    on_segment = self._points_on_oblique_segment(
+                        x0, y0, x1, y1, columns, column_coords
+                    )
+                if i is not None:
+                    on_segment = line[i:j+1] if i < j else line[j:i+1]
+                touched.extend(on_segment)
+                for a, b in zip(on_segment, on_segment[1:]):
+                    if a in pin_owners and self._is_concealed(a, b, pin_owners):
+                        continue
+                    pieces.add((a, b) if a < b else (b, a))
+
+        # the degree of a point is the number of pins and branches at it
+        self.degree = degree = [0]*len(locations)
+        for component, name, point in self.terminals:
+            degree[point] += 1
+        for a, b in pieces:
+            degree[a] += 1
+            degree[b] += 1
+
+    # _points_on_oblique_segment() {{{3
+    def _points_on_oblique_segment(self, x0, y0, x1, y1, columns, column_coords):
+        # returns the points on a segment that is neither horizontal nor
+        # vertical, in order along the segment, by searching the columns
+        # it spans
+        found = []
+        first = bisect_left(column_coords, min(x0, x1))
+        last = bisect_right(column_coords, max(x0, x1))
+        tolerance = max(abs(x1 - x0), abs(y1 - y0))
+        for x in column_coords[first:last]:
+            coords, points = columns[x]
+            lower = bisect_left(coords, min(y0, y1))
+            upper = bisect_right(coords, max(y0, y1))
+            for y, point in zip(coords[lower:upper], points[lower:upper]):
+                # the cross product is zero for points on the line, allow
+                # for the snapping
+                cross = (x - x0)*(y1 - y0) - (y - y0)*(x1 - x0)
+                if abs(cross) <= tolerance:
+                    found.append(((x - x0)*(x1 - x0), point))
+        found.sort()
+        return [point for t, point in found]
+
+    # _is_concealed() {{{3
+    def _is_concealed(self, a, b, pin_owners):
+        # the segment between two points is concealed if they are both pins
+        # of the same component and the segment passes through the component
+        owners = pin_owners[a]
+        (xa, ya), (xb, yb) = self.locations[a], self.locations[b]
+        xm, ym = (xa + xb)/2, (ya + yb)/2
+        for component in pin_owners.get(b, []):
+            if any(c is component for c in owners):
+                half = max(component.size)/2
+                xc, yc = component.center
+                if abs(xm - xc) < half and abs(ym - yc) < half:
+                    return True
+        return False
+
+    # _build_nets() {{{3
+    def _build_nets(self):
+        # the nets are only built when needed, junctions do not need them
+        sets = DisjointSet(len(self.locations))
+        for a, b in self.shorts:
+            sets.union(a, b)
+        for a, b in self.pieces:
+            sets.union(a, b)
+        find = sets.find
+        nets = {}
+
+        def net_of(point):
+            root = find(point)
+            if root not in nets:
+                nets[root] = Net()
+            return nets[root]
+
+        self._pin_nets = {}
+        for component, name, point in self.terminals:
+            net = net_of(point)
+            net.pins.append((component, name))
+            self._pin_nets[id(component), name] = net
+        # a wire belongs to every net it touches, which is more than one if
+        # it passes under a component
+        for wire, touched in self.wire_points:
+            wire_nets = {}
+            for point in touched:
+                net = net_of(point)
+                if id(net) not in wire_nets:
+                    wire_nets[id(net)] = net
+                    net.wires.append(wire)
+        for key, point in self.points.items():
+            net_of(point).points.append(self.locations[point])
+
+        # name the nets
+        candidates = {}
+        for component in self.components:
+            if isinstance(component, Ground):
+                rank, name = 0, '0'
+            elif isinstance(component, Pin) and component.name:
+                rank, name = 1, str(component.name)
+            elif isinstance(component, Label) and component.name:
+                rank, name = 2, str(component.name)
+            else:
+                continue
+            point = self.points.get(self._snap(component.center))
+            if point is None:
+                continue
+            net = net_of(point)
+            if rank < candidates.get(id(net), (3,))[0]:
+                candidates[id(net)] = (rank, name)
+        self._nets = list(nets.values())
+        self._by_name = {}
+        for net in self._nets:
+            name = candidates.get(id(net), (None, None))[1]
+            if name is not None and name not in self._by_name:
+                net.name = name
+                self._by_name[name] = net
+        index = 0
+        for net in self._nets:
+            if net.name is None:
+                index += 1
+                while 'N{}'.format(index) in self._by_name:
+                    index += 1
+                net.name = 'N{}'.format(index)
+                self._by_name[net.name] = net
+
+    # nets {{{3
+    @property
+    def nets(self):
+        "The nets, in the order of their first pin."
+        if self._nets is None:
+            self._build_nets()
+        return self._nets
+
+    # junctions() {{{3
+    def junctions(self):
+        """Returns the locations where three or more wires or pins meet.
+
+        This includes places where a wire tees into the middle of another.
+        """
+        return [
+            self.locations[point]
+            for point, degree in enumerate(self.degree) if degree >= 3
+        ]
+
+    # net() {{{3
+    def net(self, component, pin):
+        "Returns the net attached to the named pin of a component."
+        if self._nets is None:
+            self._build_nets()
+        try:
+            return self._pin_nets[id(component), pin]
+        except KeyError:
+            raise Error('unknown pin.', culprit=(component.class_name(), pin))
+
+    # connected() {{{3
+    def connected(self, *terminals):
+        "Returns True if the given (component, pin) pairs are all connected."
+        nets = set(id(self.net(c, p)) for c, p in terminals)
+        return len(nets) <= 1
+
+    def __getitem__(self, name):
+        if self._nets is None:
+            self._build_nets()
+        return self._by_name[name]
+
+    def __iter__(self):
+        return iter(self.nets)
+
+    def __len__(self):
+        return len(self.nets)
+
+    # devices() {{{3
+    def devices(self):
+        """Returns the designator of each component that has pins.
+
+        Returns a list of (designator, component) pairs.  The designator is
+        the name of the component with any white space replaced by
+        underscores, prefixed with its SPICE letter if it has one and the name
+        does not already start with it.  Unnamed components are numbered.
+        """
+        used = set()
+        devices = []
+        for component in self.components:
+            if isinstance(component, Wire) or not component.pins:
+                continue
+            card = _spice_card(component)
+            prefix = card[0] if card else component.__class__.__name__
+            name = component.name
+            if name:
+                name = '_'.join(str(name).split())
+                if card and name[:1].upper() != prefix:
+                    name = prefix + name
+                if name in used:
+                    name = None
+            if not name:
+                index = 1
+                while '{}{}'.format(prefix, index) in used:
+                    index += 1
+                name = '{}{}'.format(prefix, index)
+            used.add(name)
+            devices.append((name, component))
+        return devices
+
+    # write_spice() {{{3
+    def write_spice(self, fileobj, title=None):
+        """Writes a SPICE netlist to fileobj.
+
+        Resistors, capacitors, inductors, diodes, BJTs, MOSFETs and sources
+        are written as SPICE cards using their values, or as the model for
+        diodes and transistors.  Other components are not included.  The
+        cards are written one at a time.
+        """
+        def node(component, pin):
+            return '_'.join(self.net(component, pin).name.split())
+
+        fileobj.write('* {}\n'.format(title or 'netlist'))
+        for designator, component in self.devices():
+            card = _spice_card(component)
+            if not card:
+                continue
+            prefix, pins, value = card
+            fields = [designator] + [node(component, p) for p in pins]
+            if value is not None:
+                # SPICE does not allow a space between number and units
+                fields.append(''.join(str(value).split()))
+            fileobj.write(' '.join(fields) + '\n')
+        fileobj.write('.end\n')
+
+    # write_json() {{{3
+    def write_json(self, fileobj):
+        """Writes every device, pin and net to fileobj as JSON.
+
+        The devices are written one at a time, each with its class, kind,
+        name, value and the net attached to each of its pins, followed by the
+        nets, each with the designators and pins of the devices it connects.
+        """
+        devices = self.devices()
+        designators = {id(c): d for d, c in devices}
+        write = fileobj.write
+        write('{\n  "devices": [')
+        for i, (designator, component) in enumerate(devices):
+            device = dict(
+                designator = designator,
+                component = component.__class__.__name__,
+                kind = component.kind,
+                name = None if component.name is None else str(component.name),
+                value = None if component.value is None else str(component.value),
+                pins = {p: self.net(component, p).name for p in component.pins},
+            )
+            write((',\n    ' if i else '\n    ') + json.dumps(device))
+        write('\n  ],\n  "nets": [')
+        for i, net in enumerate(self.nets):
+            entry = dict(
+                name = net.name,
+                pins = [[designators[id(c)], p] for c, p in net.pins],
+                wires = len(net.wires),
+            )
+            write((',\n    ' if i else '\n    ') + json.dumps(entry))
+        write('\n  ]\n}\n')
+
+
+# _spice_card() {{{2
+def _spice_card(component):
+    # Returns the SPICE letter, pin order and value of a component, or None if
+    # it has no SPICE equivalent.
+    value = component.value
+    kind = (component.kind or '').lower()
+    if isinstance(component, Resistor):
+        return 'R', ['p', 'n'], value
+    if isinstance(component, Capacitor):
+        return 'C', ['p', 'n'], value
+    if isinstance(component, Inductor):
+        return 'L', ['p', 'n'], value
+    if isinstance(component, Diode):
+        return 'D', ['a', 'c'], value or 'D'
+    if isinstance(component, BJT):
+        model = 'pnp' if kind[:1] == 'p' else 'npn'
+        return 'Q', ['c', 'b', 'e'], value or model
+    if isinstance(component, MOS):
+        # the source doubles as the bulk
+        model = 'pmos' if kind[:1] == 'p' else 'nmos'
+        return 'M', ['d', 'g', 's', 's'], value or model
+    if isinstance(component, Source):
+        if kind in ('empty', 'vdc', 'sine', 'noise'):
+            return 'V', ['p', 'n'], value
+        if kind == 'idc':
+            return 'I', ['p', 'n'], value
+        if kind in ('cv', 'ci'):
+            # the controlling nodes are unknown, use a behavioral source
+            quantity = 'V' if kind == 'cv' else 'I'
+            value = None if value is None else '{}={}'.format(quantity, value)
+            return 'B', ['p', 'n'], value
+    return None
+
+
+# Wire crossings {{{1
+# find_crossings() {{{2
+def find_crossings(segments):
+    """Finds the places where line segments cross.
+
+    segments is a sequence of pairs of end points.  Returns a list of
+    (i, j, location) tuples, one for each pair of segments that cross, where
+    i < j are the indices of the two segments.  Segments cross if they meet at
+    a single point that is not an end point of either, so segments that touch
+    or overlap do not cross.  Use integer coordinates to make the test exact.
+
+    Horizontal and vertical segments are found with a sweep line that moves
+    across the segments from left to right, holding the horizontal segments
+    it currently intersects in a list sorted by height.  Each vertical
+    segment then crosses the horizontal segments found by bisection between
+    its two ends.  The searches take O(log n) time for n segments, but
+    inserting into and removing from the list takes O(m) time for m active
+    segments, so the cost is O(n log n + n m + k) for k crossings, or
+    O(n² + k) in the worst case.  m is small for typical schematics and
+    moving the list is fast, so this is rarely a concern.  Oblique
+    segments are rare in schematics; during a second sweep they are tested
+    against every segment whose horizontal extent overlaps their own.
+    """
+    crossings = []
+    events = []
+    oblique = []
+    for i, ((x0, y0), (x1, y1)) in enumerate(segments):
+        if y0 == y1:
+            if x0 != x1:
+                events.append((min(x0, x1), 2, i, y0))
+                events.append((max(x0, x1), 0, i, y0))
+        elif x0 == x1:
+            events.append((x0, 1, i, None))
+        else:
+            oblique.append(i)
+
+    # at each x, horizontal segments that end there are removed before the
+    # vertical segments are checked, and those that start there are added
+    # after, so touching segments are not reported
+    events.sort(key=lambda event: event[:2])
+    active = []
+    for x, action, i, y in events:
+        if action == 1:
+            ya, yb = segments[i][0][1], segments[i][1][1]
+            if ya > yb:
+                ya, yb = yb, ya
+            lo = bisect_right(active, (ya, len(segments)))
+            hi = bisect_left(active, (yb, -1))
+            for y, j in active[lo:hi]:
+                crossings.append((min(i, j), max(i, j), (x, y)))
+        elif action == 2:
+            active.insert(bisect_left(active, (y, i)), (y, i))
+        else:
+            del active[bisect_left(active, (y, i))]
+
+    if oblique:
+        crossings.extend(_find_oblique_crossings(segments, oblique))
+    return crossings
+
+
+# _find_oblique_crossings() {{{2
+def _orientation(a, b, c):
+    # positive if c is to the left of the line from a to b, zero if on it
+    return (b[0] - a[0])*(c[1] - a[1]) - (b[1] - a[1])*(c[0] - a[0])
+
+def _find_oblique_crossings(segments, oblique):
+    # sweeps across the segments, testing each oblique segment against the
+    # segments whose horizontal extent overlaps its own
+    oblique = set(oblique)
+    events = []
+    for i, ((x0, y0), (x1, y1)) in enumerate(segments):
+        if x0 != x1 or y0 != y1:
+            events.append((min(x0, x1), 0, i))
+            events.append((max(x0, x1), 1, i))
+    events.sort()
+    active = set()
+    active_oblique = set()
+    for x, action, i in events:
+        if action:
+            active.discard(i)
+            active_oblique.discard(i)
+            continue
+        others = active if i in oblique else active_oblique
+        p, q = segments[i]
+        for j in others:
+            r, s = segments[j]
+            d1 = _orientation(p, q, r)
+            d2 = _orientation(p, q, s)
+            if d1*d2 >= 0:
+                continue
+            d3 = _orientation(r, s, p)
+            d4 = _orientation(r, s, q)
+            if d3*d4 >= 0:
+                continue
+            t = d3/(d3 - d4)
+            location = (p[0] + t*(q[0] - p[0]), p[1] + t*(q[1] - p[1]))
+            yield min(i, j), max(i, j), location
+        active.add(i)
+        if i in oblique:
+            active_oblique.add(i)
+
+
+# _clip_segment() {{{2
+def _clip_segment(p, q, region, polygon=None):
+    # Returns the fractions of the way along the segment from p to q where it
+    # enters and leaves the rectangular region, or None if it does not pass
+    # through the interior of the region.  If polygon is given, the region is
+    # instead the convex polygon, whose vertices run counterclockwise.
+    x0, y0 = p
+    dx, dy = q[0] - x0, q[1] - y0
+    t0, t1 = 0, 1
+    if polygon:
+        for (ax, ay), (bx, by) in zip(polygon, polygon[1:] + polygon[:1]):
+            # distance inside the edge, scaled by its length
+            nx, ny = ay - by, bx - ax
+            inside = nx*(x0 - ax) + ny*(y0 - ay)
+            rate = nx*dx + ny*dy
+            if rate == 0:
+                if inside <= 0:
+                    return None
+            elif rate > 0:
+                t0 = max(t0, -inside/rate)
+            else:
+                t1 = min(t1, -inside/rate)
+        if t0 < t1:
+            return t0, t1
+        return None
+    for d, v, lo, hi in [(dx, x0, region[0], region[2]), (dy, y0, region[1], region[3])]:
+        if d == 0:
+            if v <= lo or v >= hi:
+                return None
+        else:
+            a, b = (lo - v)/d, (hi - v)/d
+            if a > b:
+                a, b = b, a
+            t0, t1 = max(t0, a), min(t1, b)
+    if t0 < t1:
+        return t0, t1
+
+
+# _format_number() {{{2
+def _format_number(value):
+    # formats a coordinate for use in path data
+    value = round(value, 3)
+    return str(int(value)) if value == int(value) else str(value)
+
+
+# Spatial index {{{1
+class RTree: # {{{2
+    '''An R-tree over axis-aligned boxes.
+
+    Entries are tuples of the form (x0, y0, x1, y1, item), where (x0, y0) is
+    the lower corner of the box and (x1, y1) the upper.  Entries are collected
+    in a buffer, which is packed into a tree using sort-tile-recursive packing
+    once it is full.  Trees of similar size are merged and repacked, so the
+    cost of adding an entry grows only slowly with the size of the index and
+    a query visits just a few trees.
+    '''
+    NODE_SIZE = 16
+    BUFFER_SIZE = 64
+    __slots__ = ('trees', 'buffer')
+
+    def __init__(self, entries=()):
+        self.trees = []     # (number of entries, root node)
+        self.buffer = []
+        self.extend(entries)
+
+    # add() {{{3
+    def add(self, entry):
+        "Adds an entry to the index."
+        self.buffer.append(entry)
+        if len(self.buffer) >= self.BUFFER_SIZE:
+            self._flush()
+
+    # extend() {{{3
+    def extend(self, entries):
+        "Adds several entries to the index."
+        self.buffer.extend(entries)
+        if len(self.buffer) >= self.BUFFER_SIZE:
+            self._flush()
+
+    # _flush() {{{3
+    def _flush(self):
+        # packs the buffer into a tree, merging it with any smaller trees
+        entries = self.buffer
+        self.buffer = []
+        while self.trees and self.trees[-1][0] <= len(entries):
+            entries.extend(self._entries(self.trees.pop()[1]))
+        self.trees.append((len(entries), self._pack(entries)))
+
+    # _pack() {{{3
+    def _pack(self, entries):
+        # Nodes are tuples of the form (x0, y0, x1, y1, children, leaf).
+        # Each level is tiled into vertical slices by x, then each slice is
+        # cut into nodes by y.
+        M = self.NODE_SIZE
+        leaf = True
+        while True:
+            count = -(-len(entries)//M)
+            width = M*int(-(-sqrt(count)//1))
+            entries.sort(key=lambda e: e[0] + e[2])
+            nodes = []
+            for i in range(0, len(entries), width):
+                strip = sorted(entries[i:i+width], key=lambda e: e[1] + e[3])
+                for j in range(0, len(strip), M):
+                    children = strip[j:j+M]
+                    x0, y0, x1, y1 = list(zip(*children))[:4]
+                    nodes.append(
+                        (min(x0), min(y0), max(x1), max(y1), children, leaf)
+                    )
+            if len(nodes) == 1:
+                return nodes[0]
+            entries = nodes
+            leaf = False
+
+    # _entries() {{{3
+    @staticmethod
+    def _entries(node):
+        # returns all entries held below node
+        entries = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node[5]:
+                entries.extend(node[4])
+            else:
+                stack.extend(node[4])
+        return entries
+
+    # search() {{{3
+    def search(self, x0, y0, x1, y1):
+        "Returns the entries whose boxes meet the given box, edges included."
+        found = [
+            e for e in self.buffer
+            if e[0] <= x1 and e[2] >= x0 and e[1] <= y1 and e[3] >= y0
+        ]
+        stack = [root for count, root in self.trees]
+        while stack:
+            node = stack.pop()
+            if node[0] > x1 or node[2] < x0 or node[1] > y1 or node[3] < y0:
+                continue
+            if node[5]:
+                found.extend(
+                    e for e in node[4]
+                    if e[0] <= x1 and e[2] >= x0 and e[1] <= y1 and e[3] >= y0
+                )
+            else:
+                stack.extend(node[4])
+        return found
+
+    # nearest() {{{3
+    def nearest(self, x, y):
+        """Generates the entries in order of increasing distance from (x, y).
+
+        The distance is that from the point to the nearest point in the box of
+        the entry.  Each is returned as a (distance, entry) pair.  Entries are
+        found as they are needed, so stopping early is cheap.
+        """
+        def distance(box):
+            dx = max(box[0] - x, 0, x - box[2])
+            dy = max(box[1] - y, 0, y - box[3])
+            return sqrt(dx*dx + dy*dy)
+
+        # the heap holds (distance, sequence number, node or entry, is entry)
+        heap = [(distance(e), n, e, True) for n, e in enumerate(self.buffer)]
+        heap.extend(
+            (distance(root), -n - 1, root, False)
+            for n, (count, root) in enumerate(self.trees)
+        )
+        heapify(heap)
+        sequence = len(heap)
+        while heap:
+            d, n, item, is_entry = heappop(heap)
+            if is_entry:
+                yield d, item
+                continue
+            leaf = item[5]
+            for child in item[4]:
+                sequence += 1
+                heappush(heap, (distance(child), sequence, child, leaf))
+
+    def __len__(self):
+        return len(self.buffer) + sum(count for count, root in self.trees)
+
+
+class SpatialIndex: # {{{2
+    '''A spatial index over the components of a schematic.
+
+    Tiles are indexed by their bounding boxes, wires by each of their
+    segments, and pins by their locations, each in an *RTree*.  The index is
+    updated incrementally; *update* adds any components placed since it was
+    last called.
+
+    Args:
+        schematic (Schematic): the schematic.
+
+    Results are returned in the order the components were created.
+    '''
+    def __init__(self, schematic):
+        self.schematic = schematic
+        self.shapes = RTree()   # tiles and wire segments
+        self.pins = RTree()
+        self.seen = 0
+        self._connectivity = None
+        self.update()
+
+    # update() {{{3
+    def update(self):
+        "Adds the components placed since the last update to the index."
+        components = self.schematic.sch_components
+        shapes = []
+        pins = []
+        for order in range(self.seen, len(components)):
+            component = components[order]
+            if isinstance(component, Wire):
+                points = component.points
+                for i, ((x0, y0), (x1, y1)) in enumerate(zip(points, points[1:])):
+                    shapes.append((
+                        min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1),
+                        (order, component, i)
+                    ))
+                continue
+            (x, y), (w, h) = component.center, component.size
+            shapes.append((
+                x - w/2, y - h/2, x + w/2, y + h/2, (order, component, None)
+            ))
+            for name in component.pins:
+                x, y = component.__dict__[name]
+                pins.append((x, y, x, y, (order, component, name)))
+        self.shapes.extend(shapes)
+        self.pins.extend(pins)
+        self.seen = len(components)
+
+    # overlapping() {{{3
+    def overlapping(self, corner1, corner2, segments=False):
+        """Returns the components that overlap the box with the given corners.
+
+        Tiles overlap if their bounding box meets the box, wires if one of
+        their segments passes through or touches the box.  If segments is
+        True, each wire is returned as a (wire, segment index) pair for every
+        segment that meets the box.
+        """
+        self.update()
+        x0, x1 = sorted((corner1[0], corner2[0]))
+        y0, y1 = sorted((corner1[1], corner2[1]))
+        found = []
+        for entry in self.shapes.search(x0, y0, x1, y1):
+            order, component, segment = entry[4]
+            if segment is not None:
+                p, q = component.points[segment], component.points[segment+1]
+                if not _segment_meets_box(p, q, (x0, y0, x1, y1)):
+                    continue
+            found.append(entry[4])
+        found.sort(key=lambda f: (f[0], f[2] or 0))
+        if segments:
+            return [
+                component if segment is None else (component, segment)
+                for order, component, segment in found
+            ]
+        components = {}
+        for order, component, segment in found:
+            components[order] = component
+        return list(components.values())
+
+    # at() {{{3
+    def at(self, point, tolerance=0, segments=False):
+        """Returns the components found at a point.
+
+        Tiles are found if the point falls within their bounding box, wires if
+        the point falls on one of their segments, in both cases allowing for
+        the tolerance.
+        """
+        x, y = point
+        return self.overlapping(
+            (x - tolerance, y - tolerance), (x + tolerance, y + tolerance),
+            segments
+        )
+
+    # nearest_pin() {{{3
+    def nearest_pin(
+        self, point, unconnected=False, exclude=(), max_distance=None,
+        resolution=0.01
+    ):
+        """Returns the pin closest to a point.
+
+        The pin is returned as a (component, pin name) pair, or None if there
+        is no pin within *max_distance*.  Pins of the components in exclude
+        are ignored.  If unconnected is True, only pins that connect to
+        nothing else are considered, meaning that no other pin or wire
+        attaches at their location, as determined by *Connectivity* with the
+        given resolution.
+        """
+        self.update()
+        exclude = set(id(c) for c in exclude)
+        connectivity = self.connectivity(resolution) if unconnected else None
+        x, y = point
+        for distance, entry in self.pins.nearest(x, y):
+            if max_distance is not None and distance > max_distance:
+                return None
+            order, component, name = entry[4]
+            if id(component) in exclude:
+                continue
+            if unconnected:
+                # the pin itself is the only thing at an unconnected location
+                key = connectivity._snap(component.__dict__[name])
+                if connectivity.degree[connectivity.points[key]] > 1:
+                    continue
+            return component, name
+        return None
+
+    # connectivity() {{{3
+    def connectivity(self, resolution=0.01):
+        "Returns the connectivity of the schematic, reusing it if up to date."
+        count = len(self.schematic.sch_components)
+        if self._connectivity:
+            nets, seen, res = self._connectivity
+            if seen == count and res == resolution:
+                return nets
+        nets = Connectivity(self.schematic, resolution)
+        self._connectivity = nets, count, resolution
+        return nets
+
+
+# _segment_meets_box() {{{2
+def _segment_meets_box(p, q, box):
+    # Returns True if the segment from p to q touches or passes through the
+    # box, whose edges are included.
+    x0, y0 = p
+    dx, dy = q[0] - x0, q[1] - y0
+    t0, t1 = 0, 1
+    for d, v, lo, hi in [(dx, x0, box[0], box[2]), (dy, y0, box[1], box[3])]:
+        if d == 0:
+            if v < lo or v > hi:
+                return False
+        else:
+            a, b = (lo - v)/d, (hi - v)/d
+            if a > b:
+                a, b = b, a
+            t0, t1 = max(t0, a), min(t1, b)
+    return t0 <= t1
+
+
+# Design rules {{{1
+class Violation: # {{{2
+    '''A violation of a design rule, as found by *Schematic.check*.
+
+    Attributes:
+        rule (str): the rule that is violated, one of 'dangling pin',
+            'dangling wire', 'overlap', 'wire through symbol' or 'off grid'.
+        message (str): a description of the violation.
+        location (xy location): where the violation occurs.
+        components (list): the components involved.
+    '''
+    __slots__ = ('rule', 'message', 'location', 'components')
+
+    def __init__(self, rule, message, location, components):
+        self.rule = rule
+        self.message = message
+        self.location = location
+        self.components = components
+
+    @property
+    def culprit(self):
+        "The class and name of each component involved."
+        return tuple(
+            ' '.join(filter(None, [c.__class__.__name__, getattr(c, 'name', None)]))
+            for c in self.components
+        )
+
+    def __str__(self):
+        return '{}: {}'.format(', '.join(self.culprit), self.message)
+
+    def __repr__(self):
+        return '{}({!r}, {!r}, {})'.format(
+            self.__class__.__name__, self.rule, self.location,
+            ', '.join(self.culprit)
+        )
+
+
+# _check_connections() {{{2
+def _check_connections(connectivity, index, resolution):
+    # Pins that connect to nothing and wire ends that land nowhere both leave
+    # a point with only one pin or branch on it.  Components that use none of
+    # their pins, such as boxes and summers, connect to any wire that ends on
+    # them.  A label names the point it is placed on, which connects it.
+    degree = connectivity.degree
+    locations = connectivity.locations
+    labelled = set(
+        connectivity.points.get(connectivity._snap(c.center))
+        for c in connectivity.components if isinstance(c, Label)
+    )
+    for component, name, point in connectivity.terminals:
+        if point in labelled:
+            continue
+        if degree[point] == 1 and name in component.used_pins():
+            location = locations[point]
+            yield Violation(
+                'dangling pin',
+                'pin {} at {} is not connected.'.format(
+                    name, _format_location(location)
+                ),
+                location, [component]
+            )
+    for component in connectivity.components:
+        if not isinstance(component, Wire):
+            continue
+        for location in component.points[:1] + component.points[-1:]:
+            point = connectivity.points[connectivity._snap(location)]
+            if degree[point] != 1 or point in labelled:
+                continue
+            if any(
+                not isinstance(c, Wire) and not c.used_pins()
+                for c in index.at(location, resolution)
+            ):
+                continue
+            yield Violation(
+                'dangling wire',
+                'wire end at {} is not connected.'.format(
+                    _format_location(location)
+                ),
+                location, [component]
+            )
+
+
+# _check_placement() {{{2
+def _check_placement(index, resolution):
+    # Symbols that overlap, and wires that pass through a symbol rather than
+    # ending on it.  The bounding box of a symbol includes a margin around its
+    # body, so symbols overlap only if their boxes share more than half of the
+    # smaller box, and boxes may enclose other symbols.  A wire may pass
+    # through a symbol from one of its pins to another, where it is hidden by
+    # the concealer.  Labels, pins and crossings are meant to sit on other
+    # components, so they are not checked.
+    exempt = (Label, Pin, Crossing)
+    for entry in index.shapes.search(-inf, -inf, inf, inf):
+        x0, y0, x1, y1, (order, component, segment) = entry
+        if segment is not None or isinstance(component, exempt):
+            continue
+        for other in index.shapes.search(x0, y0, x1, y1):
+            o_order, o_component, o_segment = other[4]
+            if isinstance(o_component, exempt):
+                continue
+            if o_segment is None:
+                if o_order <= order:
+                    continue
+                w = min(x1, other[2]) - max(x0, other[0])
+                h = min(y1, other[3]) - max(y0, other[1])
+                smaller = min(
+                    (x1 - x0)*(y1 - y0),
+                    (other[2] - other[0])*(other[3] - other[1])
+                )
+                if w*h == smaller and isinstance(
+                    component if w*h < (x1 - x0)*(y1 - y0) else o_component, Box
+                ):
+                    continue
+                if w > resolution and h > resolution and w*h > smaller/2:
+                    location = (max(x0, other[0]) + w/2, max(y0, other[1]) + h/2)
+                    yield Violation(
+                        'overlap',
+                        'symbols overlap at {}.'.format(_format_location(location)),
+                        location, [component, o_component]
+                    )
+                continue
+            # the wire connects to the symbol if it ends within it
+            points = o_component.points
+            span = _clip_segment(
+                points[o_segment], points[o_segment+1],
+                (x0 + resolution, y0 + resolution, x1 - resolution, y1 - resolution)
+            )
+            if span is None:
+                continue
+            if span[0] == 0 and o_segment == 0:
+                continue
+            if span[1] == 1 and o_segment == len(points) - 2:
+                continue
+            (px, py), (qx, qy) = points[o_segment], points[o_segment+1]
+            pins = [component.__dict__[name] for name in component.pins]
+            if all(
+                any(
+                    abs(px + t*(qx - px) - x) <= 2*resolution and
+                    abs(py + t*(qy - py) - y) <= 2*resolution
+                    for x, y in pins
+                ) for t in span
+            ):
+                continue
+            t = sum(span)/2
+            location = (px + t*(qx - px), py + t*(qy - py))
+            yield Violation(
+                'wire through symbol',
+                'wire passes through symbol at {}.'.format(
+                    _format_location(location)
+                ),
+                location, [o_component, component]
+            )
+
+
+# _check_grid() {{{2
+def _check_grid(connectivity, grid, resolution):
+    # Wire vertices and the pins that are connected should fall on the grid.
+    # Pins that connect to nothing, such as the alternate pins of a box or the
+    # body pins of a transistor, may fall anywhere.
+    def off_grid(value):
+        return abs(value - grid*round(value/grid)) > resolution
+
+    degree = connectivity.degree
+    connected = {}
+    for component, name, point in connectivity.terminals:
+        if degree[point] > 1:
+            connected.setdefault(id(component), []).append(
+                component.__dict__[name]
+            )
+    for component in connectivity.components:
+        if isinstance(component, Wire):
+            locations = component.points
+        else:
+            locations = connected.get(id(component), [])
+        for location in locations:
+            if off_grid(location[0]) or off_grid(location[1]):
+                yield Violation(
+                    'off grid',
+                    '{} is not on grid of {}.'.format(
+                        _format_location(location), _format_number(grid)
+                    ),
+                    location, [component]
+                )
+                break
+
+
+# _format_location() {{{2
+def _format_location(location):
+    return '({}, {})'.format(*(_format_number(v) for v in location))
+
+
+# Routing {{{1
+class Router: # {{{2
+    '''Finds Manhattan routes for wires that avoid the components.
+
+    Routes are found with A* search over a grid with the given pitch.  The
+    bounding boxes of the tiles cannot be entered or followed, and the pins
+    and wires already present cannot be passed through.  Wires can be
+    crossed, but not followed or joined mid-way.  Bends are penalized
+    heavily, so the route with the fewest bends is preferred, then the route
+    with the fewest crossings, then the shortest.  Labels and dots are not
+    obstacles, nor are the tiles that enclose the end points of a route.  If
+    wires are already attached to an end point, the route may instead start
+    or end on any of them, which allows a pin to fan out.
+
+    The obstacles are rasterized onto the grid as they are added, and the
+    router adds the components placed since its last route before finding
+    the next one, so the occupancy of the grid is built incrementally and
+    shared by all the routes on a schematic.  End points that are not on the
+    grid add grid lines that are checked against the obstacles directly.
+
+    Args:
+        schematic (Schematic): the schematic.
+        pitch (real): the spacing of the grid.
+        bend_cost (real): the cost of a bend, as a distance.
+        crossing_cost (real): the cost of crossing a wire, as a distance.
+    '''
+    CELL = 50           # size of the cells in the index of boxes
+    RESOLUTION = 0.01   # locations closer than this are considered the same
+
+    def __init__(self, schematic, pitch=25, bend_cost=None, crossing_cost=None):
+        self.schematic = schematic
+        self.pitch = pitch
+        self.bend_cost = 8*pitch if bend_cost is None else bend_cost
+        self.crossing_cost = pitch if crossing_cost is None else crossing_cost
+        # coordinates are snapped to integers, the grid is every step
+        self.step = self._snap(pitch)
+        self.cell = self._snap(self.CELL)
+        self.boxes = []         # tile bounding boxes
+        self.cells = {}         # cell -> indices of boxes that overlap it
+        self.box_nodes = {}     # grid node -> indices of boxes that hold it
+        self.points = set()     # pins and wire vertices
+        self.access = set()     # grid nodes just outside of each pin
+        self.wire_nodes = set() # grid nodes that fall on a wire
+        self.wire_edges = set() # grid edges that are part of a wire
+        self.paths = []         # vertices of each wire
+        self.vertices = {}      # wire vertex -> indices of its paths
+        self.vertex_rows = {}   # y -> x and path of each wire vertex
+        self.vertex_columns = {}    # x -> y and path of each wire vertex
+        self.rows = {}          # y -> x extents and paths of horizontal segments
+        self.columns = {}       # x -> y extents and paths of vertical segments
+        self.seen = 0           # number of components already added
+
+    # _snap() {{{3
+    def _snap(self, value):
+        return round(value/self.RESOLUTION)
+
+    def _grid_lines(self, lo, hi):
+        # the grid lines between lo and hi, inclusive
+        step = self.step
+        return range(-(-lo//step)*step, (hi//step)*step + 1, step)
+
+    # update() {{{3
+    def update(self):
+        "Adds the components placed since the last update to the grid."
+        snap = self._snap
+        components = self.schematic.sch_components
+        for component in components[self.seen:]:
+            if isinstance(component, Wire):
+                self.add_path(component.points)
+                continue
+            pins = [
+                (snap(x), snap(y))
+                for x, y in (component.__dict__[name] for name in component.pins)
+            ]
+            self.points.update(pins)
+            if isinstance(component, (Label, Dot)) or component.kind == 'dot':
+                continue
+            (x, y), (w, h) = component.center, component.size
+            box = (snap(x - w/2), snap(y - h/2), snap(x + w/2), snap(y + h/2))
+
+            # keep the grid node just outside each pin on the boundary clear
+            # of bends, so the pin can always be reached
+            step = self.step
+            for x, y in pins:
+                if x == box[0]:
+                    self.access.add((x - step, y))
+                elif x == box[2]:
+                    self.access.add((x + step, y))
+                elif y == box[1]:
+                    self.access.add((x, y - step))
+                elif y == box[3]:
+                    self.access.add((x, y + step))
+            n = len(self.boxes)
+            self.boxes.append(box)
+            cell = self.cell
+            for i in range(box[0]//cell, box[2]//cell + 1):
+                for j in range(box[1]//cell, box[3]//cell + 1):
+                    self.cells.setdefault((i, j), []).append(n)
+            for x in self._grid_lines(box[0], box[2]):
+                for y in self._grid_lines(box[1], box[3]):
+                    self.box_nodes.setdefault((x, y), []).append(n)
+        self.seen = len(components)
+
+    # add_path() {{{3
+    def add_path(self, points):
+        "Adds the segments of a wire to the grid."
+        snap = self._snap
+        step = self.step
+        points = [(snap(x), snap(y)) for x, y in points]
+        path = len(self.paths)
+        self.paths.append(points)
+        self.points.update(points)
+        for x, y in points:
+            self.vertices.setdefault((x, y), []).append(path)
+            self.vertex_rows.setdefault(y, []).append((x, path))
+            self.vertex_columns.setdefault(x, []).append((y, path))
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            if y0 == y1 and x0 != x1:
+                lo, hi = min(x0, x1), max(x0, x1)
+                self.rows.setdefault(y0, []).append((lo, hi, path))
+                if y0 % step == 0:
+                    for x in self._grid_lines(lo, hi):
+                        self.wire_nodes.add((x, y0))
+                    for x in self._grid_lines(lo - step + 1, hi - 1):
+                        self.wire_edges.add((x, y0, 0))
+            elif x0 == x1 and y0 != y1:
+                lo, hi = min(y0, y1), max(y0, y1)
+                self.columns.setdefault(x0, []).append((lo, hi, path))
+                if x0 % step == 0:
+                    for y in self._grid_lines(lo, hi):
+                        self.wire_nodes.add((x0, y))
+                    for y in self._grid_lines(lo - step + 1, hi - 1):
+                        self.wire_edges.add((x0, y, 1))
+
+    # _in_box() {{{3
+    def _in_box(self, x, y, ignore=()):
+        # returns True if the snapped point falls in or on the boundary of
+        # a box other than those in ignore
+        step = self.step
+        if x % step == 0 and y % step == 0:
+            return any(n not in ignore for n in self.box_nodes.get((x, y), ()))
+        for n in self.cells.get((x//self.cell, y//self.cell), ()):
+            x0, y0, x1, y1 = self.boxes[n]
+            if x0 <= x <= x1 and y0 <= y <= y1 and n not in ignore:
+                return True
+        return False
+
+    def _boxes_enclosing(self, x, y):
+        # returns the indices of the boxes whose interior contains the snapped
+        # point
+        return {
+            n for n in self.cells.get((x//self.cell, y//self.cell), ())
+            if self.boxes[n][0] < x < self.boxes[n][2]
+            and self.boxes[n][1] < y < self.boxes[n][3]
+        }
+
+    # _on_wire() {{{3
+    def _on_wire(self, x, y):
+        # returns True if the snapped point falls on a horizontal or vertical
+        # wire segment
+        step = self.step
+        if x % step == 0 and y % step == 0:
+            return (x, y) in self.wire_nodes
+        return (
+            any(x0 <= x <= x1 for x0, x1, _ in self.rows.get(y, ())) or
+            any(y0 <= y <= y1 for y0, y1, _ in self.columns.get(x, ()))
+        )
+
+    # _attached() {{{3
+    def _attached(self, point):
+        # returns the indices of the paths connected to the snapped point,
+        # either directly or through other paths
+        found = set()
+        todo = [point]
+        while todo:
+            x, y = todo.pop()
+            paths = set(self.vertices.get((x, y), ()))
+            paths.update(p for lo, hi, p in self.rows.get(y, ()) if lo <= x <= hi)
+            paths.update(p for lo, hi, p in self.columns.get(x, ()) if lo <= y <= hi)
+            for path in paths - found:
+                found.add(path)
+                points = self.paths[path]
+                todo.extend(points)
+                # include the paths that end part way along this one
+                for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                    if y0 == y1:
+                        lo, hi = min(x0, x1), max(x0, x1)
+                        todo.extend(
+                            (v, y0) for v, p in self.vertex_rows.get(y0, ())
+                            if lo < v < hi and p not in found
+                        )
+                    elif x0 == x1:
+                        lo, hi = min(y0, y1), max(y0, y1)
+                        todo.extend(
+                            (x0, v) for v, p in self.vertex_columns.get(x0, ())
+                            if lo < v < hi and p not in found
+                        )
+        return found
+
+    # _edge_free() {{{3
+    def _edge_free(self, x0, y0, x1, y1, ignore):
+        # returns True if the snapped segment between adjacent nodes neither
+        # runs through a box nor follows a wire
+        step = self.step
+        if x0 > x1 or y0 > y1:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        if x0 % step == 0 and y0 % step == 0 and x1 - x0 + y1 - y0 == step:
+            # an edge of the grid
+            if (x0, y0, 0 if y0 == y1 else 1) in self.wire_edges:
+                return False
+            boxes = self.box_nodes
+            shared = set(boxes.get((x0, y0), ())) & set(boxes.get((x1, y1), ()))
+            return not shared - ignore
+        if self._in_box((x0 + x1)//2, (y0 + y1)//2, ignore):
+            return False
+        if y0 == y1:
+            return not any(a < x1 and x0 < b for a, b, _ in self.rows.get(y0, ()))
+        return not any(a < y1 and y0 < b for a, b, _ in self.columns.get(x0, ()))
+
+    # route() {{{3
+    def route(self, a, b, join_a=True, join_b=True):
+        """Returns the vertices of a route from a to b.
+
+        If join_a is true and wires are already attached to a, the route may
+        start on any of them rather than at a, and likewise for join_b and b.
+        Raises Error if there is no route.
+        """
+        self.update()
+        snap = self._snap
+        schematic = self.schematic
+        pitch = self.pitch
+        end_points = [(snap(a[0]), snap(a[1])), (snap(b[0]), snap(b[1]))]
+        nets = [
+            self._attached(point) if join else set()
+            for point, join in zip(end_points, [join_a, join_b])
+        ]
+
+        # the grid covers the schematic with a margin, plus lines through the
+        # end points and the vertices of the wires attached to them
+        margin = 2*pitch
+        lo_x = min(schematic.sch_min_x, a[0], b[0]) - margin
+        hi_x = max(schematic.sch_max_x, a[0], b[0]) + margin
+        lo_y = min(schematic.sch_min_y, a[1], b[1]) - margin
+        hi_y = max(schematic.sch_max_y, a[1], b[1]) + margin
+        x_values = {
+            snap(pitch*k): pitch*k
+            for k in range(int(lo_x//pitch), int(hi_x//pitch) + 2)
+        }
+        y_values = {
+            snap(pitch*k): pitch*k
+            for k in range(int(lo_y//pitch), int(hi_y//pitch) + 2)
+        }
+        for point, snapped in zip([a, b], end_points):
+            x_values[snapped[0]] = point[0]
+            y_values[snapped[1]] = point[1]
+        scale = self.RESOLUTION
+        for path in set().union(*nets):
+            for x, y in self.paths[path]:
+                x_values.setdefault(x, x*scale)
+                y_values.setdefault(y, y*scale)
+        xs = sorted(x_values)
+        ys = sorted(y_values)
+
+        # the nodes at which the route may start and end
+        def nodes(point, net):
+            x, y = point
+            found = {(bisect_left(xs, x), bisect_left(ys, y))}
+            for path in net:
+                points = self.paths[path]
+                for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                    if y0 == y1:
+                        j = bisect_left(ys, y0)
+                        lo = bisect_left(xs, min(x0, x1))
+                        hi = bisect_right(xs, max(x0, x1))
+                        found.update((i, j) for i in range(lo, hi))
+                    elif x0 == x1:
+                        i = bisect_left(xs, x0)
+                        lo = bisect_left(ys, min(y0, y1))
+                        hi = bisect_right(ys, max(y0, y1))
+                        found.update((i, j) for j in range(lo, hi))
+            return found
+        sources = nodes(end_points[0], nets[0])
+        targets = nodes(end_points[1], nets[1])
+        start = (bisect_left(xs, end_points[0][0]), bisect_left(ys, end_points[0][1]))
+        goal = (bisect_left(xs, end_points[1][0]), bisect_left(ys, end_points[1][1]))
+
+        # a route may leave a tile from a pin on its boundary, and the tiles
+        # that enclose the end points are not obstacles at all
+        ignore = set()
+        for i, j in (start, goal):
+            ignore.update(self._boxes_enclosing(xs[i], ys[j]))
+        ends = {(xs[i], ys[j]) for i, j in sources | targets}
+        step = self.step
+        own_access = {
+            (x + dx, y + dy) for x, y in end_points
+            for dx, dy in [(step, 0), (-step, 0), (0, step), (0, -step)]
+        }
+
+        states = {}
+        def node_state(i, j):
+            # 0: free, 1: on a wire or in front of a pin (may only be
+            # crossed), 2: blocked
+            state = states.get((i, j))
+            if state is None:
+                x, y = xs[i], ys[j]
+                if (x, y) in ends:
+                    state = 0
+                elif (x, y) in self.points or self._in_box(x, y, ignore):
+                    state = 2
+                elif (x, y) in self.access and (x, y) not in own_access:
+                    state = 1
+                else:
+                    state = 1 if self._on_wire(x, y) else 0
+                states[i, j] = state
+            return state
+
+        directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+        def exits(i, j):
+            # the directions in which one can move from a node
+            for d, (di, dj) in enumerate(directions):
+                ni, nj = i + di, j + dj
+                if 0 <= ni < len(xs) and 0 <= nj < len(ys):
+                    if node_state(ni, nj) != 2 and self._edge_free(
+                        xs[i], ys[j], xs[ni], ys[nj], ignore
+                    ):
+                        yield d, ni, nj
+
+        # fail quickly if either end is boxed in
+        if not sources & targets:
+            for culprit, group in [(a, sources), (b, targets)]:
+                if not any(any(exits(*node)) for node in group):
+                    raise Error('no route found, pin is blocked.', culprit=culprit)
+
+        # the estimate is the distance to the box that holds the targets, plus
+        # a bend if the route must bend to reach the only target
+        bend_cost = self.bend_cost/scale
+        crossing_cost = self.crossing_cost/scale
+        tx_lo = min(xs[i] for i, j in targets)
+        tx_hi = max(xs[i] for i, j in targets)
+        ty_lo = min(ys[j] for i, j in targets)
+        ty_hi = max(ys[j] for i, j in targets)
+        bend = bend_cost if len(targets) == 1 else 0
+        def estimate(i, j):
+            x, y = xs[i], ys[j]
+            dx = tx_lo - x if x < tx_lo else x - tx_hi if x > tx_hi else 0
+            dy = ty_lo - y if y < ty_lo else y - ty_hi if y > ty_hi else 0
+            return dx + dy + (bend if dx and dy else 0)
+
+        queue = []
+        costs = {}
+        for count, node in enumerate(sorted(sources)):
+            queue.append((estimate(*node), 0, -count - 1, node, None))
+            costs[node, None] = 0
+        heapify(queue)
+        previous = {}
+        count = 0
+        while queue:
+            f, cost, _, node, direction = heappop(queue)
+            if node in targets:
+                break
+            if cost > costs[node, direction]:
+                continue
+            i, j = node
+            crossing = node_state(i, j) == 1
+            for d, ni, nj in exits(i, j):
+                new_cost = cost + abs(xs[ni] - xs[i]) + abs(ys[nj] - ys[j])
+                if direction is not None and d != direction:
+                    if (d - direction) % 4 == 2 or crossing:
+                        continue    # no reversing, no turning on a wire
+                    new_cost += bend_cost
+                if states[ni, nj] == 1:
+                    new_cost += crossing_cost
+                key = ((ni, nj), d)
+                if new_cost < costs.get(key, new_cost + 1):
+                    costs[key] = new_cost
+                    previous[key] = (node, direction)
+                    count += 1
+                    heappush(
+                        queue,
+                        (new_cost + estimate(ni, nj), new_cost, count, (ni, nj), d)
+                    )
+        else:
+            raise Error('no route found.', culprit=(a, b))
+
+        # recover the route, keeping only the end points and the bends
+        state = (node, direction)
+        nodes = [node]
+        while state in previous:
+            state = previous[state]
+            nodes.append(state[0])
+        nodes.reverse()
+        def location(node):
+            return x_values[xs[node[0]]], y_values[ys[node[1]]]
+        route = [tuple(a) if nodes[0] == start else location(nodes[0])]
+        for (i0, j0), (i1, j1), (i2, j2) in zip(nodes, nodes[1:], nodes[2:]):
+            if (i1 - i0, j1 - j0) != (i2 - i1, j2 - j1):
+                route.append(location((i1, j1)))
+        route.append(tuple(b) if nodes[-1] == goal else location(nodes[-1]))
+        self.add_path(route)
+        return route
+
+
+# Command line interface {{{1
+# _save_class_attributes() {{{2
+def _save_class_attributes():
+    # Returns the attributes of Schematic and of every class derived from it,
+    # such as the configurable sch_LINE_WIDTH or Tile.UNIT_WIDTH, so that they
+    # can be restored after running a script that changes them.
+    saved = {}
+    classes = [Schematic]
+    while classes:
+        cls = classes.pop()
+        if cls not in saved:
+            saved[cls] = {
+                k: v for k, v in vars(cls).items() if not k.startswith('__')
+            }
+            classes.extend(cls.__subclasses__())
+    return saved
+
+
+# _restore_class_attributes() {{{2
+def _restore_class_attributes(saved):
+    # Undoes any changes to the attributes saved by _save_class_attributes,
+    # removing any that were added.
+    for cls, attributes in saved.items():
+        for k, v in list(vars(cls).items()):
+            if k.startswith('__'):
+                continue
+            if k not in attributes:
+                delattr(cls, k)
+            elif attributes[k] is not v:
+                setattr(cls, k, attributes[k])
+        for k, v in attributes.items():
+            if k not in vars(cls):
+                setattr(cls, k, v)
+
+
+# _build_script() {{{2
+def _build_script(path, dry_run=False):
+    # Runs one schematic script in a worker process.  Workers are reused, so
+    # svgwrite and inform are only imported once per worker, but that means
+    # any state the script leaves behind must be undone before the next.
+    # If dry_run is true, the schematics are dry runs unless the script says
+    # otherwise.
+    from contextlib import redirect_stdout, redirect_stderr
+    from inform import get_informer
+    from svgwrite.utils import AutoID
+    import runpy
+    import sys
+
+    global written_files
+    directory, name = os.path.split(os.path.abspath(path))
+    defaults = _save_class_attributes()
+    cwd, argv, sys_path = os.getcwd(), sys.argv, sys.path[:]
+    informer = get_informer()
+    output = io.StringIO()
+    failure = None
+    written_files = []
+    AutoID._set_value(1)
+    start = time.perf_counter()
+    try:
+        Schematic.sch_DRY_RUN = dry_run
+        os.chdir(directory)
+        sys.argv = [name]
+        sys.path.insert(0, directory)
+        with redirect_stdout(output), redirect_stderr(output):
+            runpy.run_path(name, run_name='__main__')
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            failure = 'exit status {}.'.format(e.code)
+    except Exception as e:
+        failure = '{}: {}'.format(e.__class__.__name__, e)
+    finally:
+        elapsed = time.perf_counter() - start
+        os.chdir(cwd)
+        sys.argv, sys.path[:] = argv, sys_path
+        active_schematic.set(None)
+        _restore_class_attributes(defaults)
+        # the templates hold on to any component classes the script defined
+        Tile._templates.clear()
+    outputs, written_files = written_files, None
+    if informer.errors_accrued(reset=True) and not failure:
+        failure = 'script reported errors.'
+    return elapsed, output.getvalue(), failure, outputs
+
+
+# _find_scripts() {{{2
+def _find_scripts(paths):
+    # Directories are searched for Python files that import svg_schematic,
+    # other paths are taken as is.
+    scripts = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                script = os.path.normpath(os.path.join(path, name))
+                if name.endswith('.py') and os.path.isfile(script):
+                    with io.open(script, encoding='utf-8') as f:
+                        if 'svg_schematic' in f.read():
+                            scripts.append(script)
+        elif os.path.exists(path):
+            scripts.append(path)
+        else:
+            raise Error('not found.', culprit=path)
+    return scripts
+
+
+# Build cache {{{2
+# Each directory that contains scripts gets a cache file that maps the name
+# of each script that built successfully to the hash of its source and the
+# hashes of the files it wrote.  A script is skipped if neither has changed.
+CACHE_FILE = '.svg_schematic.cache'
+
+def _file_hash(path):
+    with io.open(path, mode='rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _source_hash(script, library):
+    # Hashes the script, the local modules it imports, and the library
+    # digest, which covers this version of svg_schematic.
+    directory = os.path.dirname(os.path.abspath(script))
+    digest = hashlib.sha256(library.encode('ascii'))
+    pending = [os.path.abspath(script)]
+    seen = set()
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with io.open(path, mode='rb') as f:
+            source = f.read()
+        digest.update(os.path.relpath(path, directory).encode('utf-8'))
+        digest.update(hashlib.sha256(source).digest())
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                prefix = node.module + '.' if node.module else ''
+                modules = [prefix + alias.name for alias in node.names]
+                if node.module:
+                    modules.append(node.module)
+            else:
+                continue
+            for module in modules:
+                base = os.path.join(directory, *module.split('.'))
+                for candidate in [base + '.py', os.path.join(base, '__init__.py')]:
+                    if os.path.isfile(candidate):
+                        pending.append(candidate)
+    return digest.hexdigest()
+
+def _load_cache(directory):
+    try:
+        with io.open(os.path.join(directory, CACHE_FILE), encoding='utf-8') as f:
+            cache = json.load(f)
+        if isinstance(cache, dict):
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {}
+
+def _save_cache(directory, cache):
+    path = os.path.join(directory, CACHE_FILE)
+    try:
+        with io.open(path + '.tmp', mode='w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        warn(os_error(e))
+
+def _is_current(directory, entry, key):
+    # Returns True if the script is unchanged and its outputs are untouched.
+    if not entry or entry.get('hash') != key or not entry.get('outputs'):
+        return False
+    try:
+        return all(
+            _file_hash(os.path.join(directory, name)) == digest
+            for name, digest in entry['outputs'].items()
+        )
+    except OSError:
+        return False
+
+
+# _compare_with_golden() {{{2
+def _compare_with_golden(directory, golden):
+    # Compares each SVG file in directory, compressed or not, against its
+    # golden copy, returns the number of mismatches.
+    import filecmp
+    golden = os.path.join(directory, golden)
+    if not os.path.isdir(golden):
+        return 0
+    mismatches = 0
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(('.svg', '.svgz')):
+            continue
+        svg_file = os.path.join(directory, name)
+        golden_file = os.path.join(golden, name)
+        if not os.path.exists(golden_file):
+            warn('no golden result.', culprit=svg_file)
+        elif not filecmp.cmp(svg_file, golden_file, shallow=False):
+            error('differs from golden result.', culprit=svg_file)
+            mismatches += 1
+    return mismatches
+
+
+# build() {{{2
+def build(paths, jobs=None, golden='Golden', use_cache=True, dry_run=False):
+    """Build schematics in parallel.
+
+    Runs each schematic script found in paths in a pool of worker processes.
+    Any directory in paths is searched for Python files that import
+    svg_schematic.  The number of workers defaults to the number of cores.
+
+    If use_cache is true, a script is skipped if it, the local modules it
+    imports, svg_schematic, and the files it previously wrote are all
+    unchanged since it last ran successfully.  Otherwise every script is run,
+    but the cache is still updated so later builds can skip them.
+
+    If a directory that contains scripts also contains a directory named
+    golden, the SVG files in that directory are compared against the ones
+    in golden.  Returns the number of scripts that failed plus the number of
+    mismatches.
+
+    If dry_run is true, the schematics are laid out but not drawn or written,
+    which is useful to quickly find the scripts that fail.  The cache and the
+    golden results are not used.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    scripts = _find_scripts(paths)
+    if not scripts:
+        warn('no schematic scripts found.')
+        return 0
+    if dry_run:
+        use_cache = False
+    directories = sorted(set(os.path.dirname(s) or '.' for s in scripts))
+    caches = {d: {} if dry_run else _load_cache(d) for d in directories}
+
+    # find the scripts that must be run
+    library = __version__ + ':' + _file_hash(__file__)
+    keys = {}
+    stale = []
+    for script in scripts:
+        directory, name = os.path.split(script)
+        keys[script] = key = _source_hash(script, library)
+        entry = caches[directory or '.'].get(name)
+        if not use_cache or not _is_current(directory or '.', entry, key):
+            stale.append(script)
+
+    # run them
+    failures = 0
+    cpu_time = 0
+    jobs = min(jobs or os.cpu_count() or 1, len(stale)) or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(partial(_build_script, dry_run=dry_run), stale)
+        rerun = set(stale)
+        for script in scripts:
+            if script not in rerun:
+                display('  cached   {}'.format(script))
+                continue
+            elapsed, output, failure, outputs = next(results)
+            cpu_time += elapsed
+            display('{:7.3f}s  {}'.format(elapsed, script))
+            if output:
+                display(output.rstrip(), culprit=script)
+            directory, name = os.path.split(script)
+            cache = caches[directory or '.']
+            cache.pop(name, None)
+            if failure:
+                error(failure, culprit=script)
+                failures += 1
+            elif outputs:
+                cache[name] = dict(
+                    hash = keys[script],
+                    outputs = {
+                        os.path.relpath(o, directory or '.'): _file_hash(o)
+                        for o in outputs if os.path.exists(o)
+                    }
+                )
+    wall_time = time.perf_counter() - start
+
+    if not dry_run:
+        for directory in directories:
+            _save_cache(directory, caches[directory])
+            failures += _compare_with_golden(directory, golden)
+
+    display(
+        'built {} in {:.3f}s using {} ({:.3f}s of script time).'.format(
+            plural(stale).format('# schematic/s'),
+            wall_time,
+            plural(jobs).format('# job/s'),
+            cpu_time
+        )
+    )
+    if use_cache:
+        hits = len(scripts) - len(stale)
+        display('cache: {} hits, {} misses.'.format(hits, len(stale)))
+    return failures
+
+
+# main() {{{2
+def main(args=None):
+    "Entry point for the svg-schematic command."
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog = 'svg-schematic',
+        description = 'Tools for SVG schematics.',
+    )
+    parser.add_argument(
+        '--version', action='version', version='%(prog)s ' + __version__
+    )
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    build_cmd = commands.add_parser(
+        'build',
+        help = 'run schematic scripts in parallel',
+        description = (
+            'Run schematic scripts in a pool of worker processes, report '
+            'how long each took, and compare the results against the '
+            'golden results if available.'
+        ),
+    )
+    build_cmd.add_argument(
+        'paths', nargs='*', default=['.'], metavar='path',
+        help = 'script, or directory that contains scripts (default: .)',
+    )
+    build_cmd.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help = 'number of worker processes (default: number of cores)',
+    )
+    build_cmd.add_argument(
+        '-f', '--force', action='store_true',
+        help = 'run every script, ignoring the build cache',
+    )
+    build_cmd.add_argument(
+        '-g', '--golden', default='Golden',
+        help = 'name of directory that holds golden results (default: Golden)',
+    )
+    build_cmd.add_argument(
+        '-n', '--dry-run', action='store_true',
+        help = 'lay out the schematics without drawing or writing them',
+    )
+    cmdline = parser.parse_args(args)
+
+    try:
+        build(
+            cmdline.paths, cmdline.jobs, cmdline.golden,
+            use_cache = not cmdline.force,
+            dry_run = cmdline.dry_run
+        )
+    except Error as e:
+        e.report()
+    terminate()
+
+
+if __name__ == '__main__':
+    # the scripts import svg_schematic, so run from that module rather than
+    # from __main__, otherwise the two would have separate state
+    import svg_schematic
+    svg_schematic.main()
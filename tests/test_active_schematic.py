@@ -0,0 +1,29 @@
+# Tests for the active schematic
+
+import pytest
+from svg_schematic import Resistor, Schematic, active_schematic
+
+
+def test_close_restores_previous(tmp_path):
+    outer = Schematic(filename=str(tmp_path / 'outer.svg'))
+    inner = Schematic(filename=str(tmp_path / 'inner.svg'))
+    assert active_schematic.get() is inner
+    Resistor(C=(100, 0))
+    inner.close()
+    assert active_schematic.get() is outer
+    Resistor(C=(100, 0))
+    outer.close()
+    assert active_schematic.get() is None
+
+
+def test_failed_close_restores_previous(tmp_path):
+    # the schematic is deactivated even if it cannot be written
+    outer = Schematic(filename=str(tmp_path / 'outer.svg'))
+    inner = Schematic(filename=str(tmp_path / 'missing' / 'inner.svg'))
+    Resistor(C=(100, 0))
+    with pytest.raises(OSError):
+        inner.close()
+    assert active_schematic.get() is outer
+    Resistor(C=(100, 0))
+    outer.close()
+    assert active_schematic.get() is None
@@ -0,0 +1,47 @@
+# Tests for building many schematics
+
+import json
+import os
+from svg_schematic import (
+    CACHE_FILE, Resistor, Schematic, Tile, _build_script, build
+)
+
+SCRIPT = '''
+from svg_schematic import Resistor, Schematic, Tile
+Schematic.sch_LINE_WIDTH = 3
+Tile.UNIT_WIDTH = 200
+Resistor.sch_EXTRA = True
+with Schematic(filename='{}.svg'):
+    Resistor(C=(100, 100))
+'''
+
+
+def write_script(directory, name):
+    path = directory / (name + '.py')
+    path.write_text(SCRIPT.format(name))
+    return str(path)
+
+
+def test_class_attributes_are_restored(tmp_path):
+    line_width, unit_width = Schematic.sch_LINE_WIDTH, Tile.UNIT_WIDTH
+    elapsed, output, failure, outputs = _build_script(write_script(tmp_path, 'a'))
+    assert failure is None
+    assert outputs == [str(tmp_path / 'a.svg')]
+    assert Schematic.sch_LINE_WIDTH == line_width
+    assert Tile.UNIT_WIDTH == unit_width
+    assert not hasattr(Resistor, 'sch_EXTRA')
+
+
+def test_forced_build_updates_cache(tmp_path):
+    write_script(tmp_path, 'a')
+    write_script(tmp_path, 'b')
+    assert build([str(tmp_path)], jobs=1, use_cache=False) == 0
+    with open(str(tmp_path / CACHE_FILE)) as f:
+        cache = json.load(f)
+    assert sorted(cache) == ['a.py', 'b.py']
+    assert os.path.exists(str(tmp_path / 'a.svg'))
+
+
+def test_templates_are_cleared(tmp_path):
+    _build_script(write_script(tmp_path, 'a'))
+    assert not Tile._templates
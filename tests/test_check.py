@@ -0,0 +1,67 @@
+# Tests for the design rule checks
+
+from svg_schematic import Amp, Box, Label, Pin, Resistor, Schematic, Wire
+
+
+def test_box_without_violations(tmp_path):
+    # the alternate pins of the box are off grid, but are not used
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        b = Box(C=(0, 0), name='B')
+        i = Pin(C=(-150, 0), kind='in', name='i')
+        o = Pin(C=(150, 0), kind='out', name='o')
+        Wire([i.C, b.i])
+        Wire([b.o, o.C])
+        assert schematic.check() == []
+
+
+def test_amp_without_violations(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        a = Amp(C=(0, 0), kind='oa', name='A')
+        p = Pin(C=(-150, a.pi[1]), kind='in', name='p')
+        n = Pin(C=(-150, a.ni[1]), kind='in', name='n')
+        o = Pin(C=(150, 0), kind='out', name='o')
+        Wire([p.C, a.pi])
+        Wire([n.C, a.ni])
+        Wire([a.o, o.C])
+        assert schematic.check() == []
+
+
+def test_dangling_pin_and_wire(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        r = Resistor(C=(0, 0), name='R')
+        Wire([r.p, (100, 0)])
+        rules = sorted(v.rule for v in schematic.check())
+        assert rules == ['dangling pin', 'dangling wire']
+
+
+def test_off_grid(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Wire([(0, 0), (110, 0)])
+        Wire([(110, 0), (110, 100)])
+        rules = [v.rule for v in schematic.check() if v.rule == 'off grid']
+        assert rules == ['off grid', 'off grid']
+        assert not [v for v in schematic.check(grid=0) if v.rule == 'off grid']
+
+
+def test_overlap_and_wire_through_symbol(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Resistor(C=(0, 0), name='R1')
+        Resistor(C=(10, 0), name='R2')
+        Resistor(C=(200, 0), orient='v', name='R3')
+        Wire([(150, 0), (250, 0)])
+        rules = set(v.rule for v in schematic.check(grid=0))
+        assert 'overlap' in rules
+        assert 'wire through symbol' in rules
+
+
+def test_labels_and_pins_connect(tmp_path):
+    # a pin with a label or a pin component on it is not dangling, nor is
+    # a wire that ends on a label
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        r = Resistor(C=(0, 0), name='R')
+        Label(C=r.n, loc='n', name='Vdd')
+        Pin(C=r.p, kind='out', name='o')
+        Wire([(0, 100), (100, 100)])
+        Label(C=(0, 100), loc='w', name='a')
+        Label(C=(100, 100), loc='e', name='b')
+        assert schematic.check() == []
@@ -0,0 +1,82 @@
+# Tests for clipping wires under components
+
+from svg_schematic import Amp, Box, Gate, Resistor, Schematic, Source, Wire
+
+
+def path(wire):
+    return wire.sch_line.attribs.get('d')
+
+
+def test_concealer(tmp_path):
+    with Schematic(
+        filename=str(tmp_path / 'test.svg'), clip_wires=True, background='none'
+    ):
+        wire = Wire([(0, 0), (200, 0)])
+        Resistor(C=(100, 0))
+    # the concealer stops short of the pins, which are at 50 and 150
+    assert path(wire) == 'M0,0 L54,0 M146,0 L200,0'
+
+
+def test_wire_over_component(tmp_path):
+    # wires created after the component are drawn over it and are not clipped
+    with Schematic(
+        filename=str(tmp_path / 'test.svg'), clip_wires=True, background='none'
+    ):
+        Resistor(C=(100, 0))
+        wire = Wire([(0, 0), (200, 0)])
+    assert path(wire) is None
+
+    # unless the schematic has layers
+    with Schematic(
+        filename=str(tmp_path / 'test.svg'), clip_wires=True, layers=True
+    ):
+        Resistor(C=(100, 0))
+        wire = Wire([(0, 0), (200, 0)])
+    assert path(wire) is not None
+
+
+def test_amp(tmp_path):
+    # the wire is clipped to the outline of the triangle
+    with Schematic(
+        filename=str(tmp_path / 'test.svg'), clip_wires=True, background='none'
+    ):
+        through = Wire([(-200, 0), (200, 0)])
+        below = Wire([(-200, 25), (200, 25)])
+        outside = Wire([(-200, 60), (200, 60)])
+        rotated = Wire([(325, 0), (325, 600)])
+        Amp(C=(0, 0))
+        Amp(C=(300, 300), orient='v')
+    assert path(through) == 'M-200,0 L-50,0 M50,0 L200,0'
+    assert path(below) == 'M-200,25 L-50,25 M0,25 L200,25'
+    assert path(outside) is None
+    assert path(rotated) == 'M325,0 L325,300 M325,350 L325,600'
+
+
+def test_round_bodies(tmp_path):
+    with Schematic(
+        filename=str(tmp_path / 'test.svg'), clip_wires=True, background='none'
+    ):
+        wire = Wire([(0, 300), (0, 500)])
+        Source(C=(0, 400), kind='vdc', orient='h')
+        diamond = Wire([(200, 300), (200, 500)])
+        Source(C=(200, 400), kind='cv', orient='h')
+    assert path(wire) == 'M0,300 L0,375 M0,425 L0,500'
+    assert path(diamond) == 'M200,300 L200,362.5 M200,437.5 L200,500'
+
+
+def test_gate_and_box(tmp_path):
+    with Schematic(
+        filename=str(tmp_path / 'test.svg'), clip_wires=True, background='none'
+    ):
+        wire = Wire([(-300, 0), (300, 0)])
+        Gate(C=(0, 0))
+        transparent = Wire([(-300, 200), (300, 200)])
+        opaque = Wire([(-300, 400), (300, 400)])
+        Box(C=(0, 200), background='none')
+        b = Box(C=(0, 400))
+    # the leads of the gate are not part of its body
+    assert path(wire) == 'M-300,0 L-35.5,0 M35.5,0 L300,0'
+    assert path(transparent) is None
+    assert path(opaque) == 'M-300,400 L{},400 M{},400 L300,400'.format(
+        int(b.W[0]), int(b.E[0])
+    )
@@ -0,0 +1,38 @@
+# Tests for connectivity extraction
+
+from svg_schematic import Ground, Resistor, Schematic, Wire
+
+
+def test_wire_through_component(tmp_path):
+    # the wire is split by the resistor, it belongs to the nets on both sides
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        wire = Wire([(0, 0), (200, 0)])
+        r = Resistor(C=(100, 0), name='R')
+        connectivity = schematic.connectivity()
+        p = connectivity.net(r, 'p')
+        n = connectivity.net(r, 'n')
+    assert p is not n
+    assert p.wires == [wire]
+    assert n.wires == [wire]
+
+
+def test_wire_listed_once_per_net(tmp_path):
+    # a wire with several vertices on the same net is listed only once
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        r = Resistor(C=(100, 0), name='R')
+        wire = Wire([r.p, (250, 0), (250, 100), (300, 100)])
+        connectivity = schematic.connectivity()
+        net = connectivity.net(r, 'p')
+    assert net.wires == [wire]
+    assert connectivity.net(r, 'n').wires == []
+
+
+def test_grounds_are_joined(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        r = Resistor(C=(100, 0), orient='v', name='R')
+        Ground(C=r.n)
+        g = Ground(C=(300, 100))
+        connectivity = schematic.connectivity()
+    net = connectivity.net(r, 'n')
+    assert net.name == '0'
+    assert (g, 't') in net
@@ -0,0 +1,90 @@
+# Tests for wire crossings and hop-overs
+
+import random
+import pytest
+from inform import Error
+from svg_schematic import Resistor, Schematic, Wire, find_crossings, _orientation
+
+
+def brute_force(segments):
+    crossings = set()
+    for i, (p, q) in enumerate(segments):
+        for j in range(i + 1, len(segments)):
+            r, s = segments[j]
+            d1, d2 = _orientation(p, q, r), _orientation(p, q, s)
+            d3, d4 = _orientation(r, s, p), _orientation(r, s, q)
+            if d1*d2 < 0 and d3*d4 < 0:
+                crossings.add((i, j))
+    return crossings
+
+
+def test_find_crossings():
+    rng = random.Random(0)
+    segments = []
+    for _ in range(300):
+        x, y = rng.randrange(50), rng.randrange(50)
+        length = rng.randrange(1, 20)
+        kind = rng.randrange(5)
+        if kind < 2:
+            segments.append(((x, y), (x + length, y)))
+        elif kind < 4:
+            segments.append(((x, y + length), (x, y)))
+        else:
+            segments.append(((x, y), (x + length, y + rng.randrange(-20, 20))))
+    found = find_crossings(segments)
+    assert len(found) == len(set((i, j) for i, j, _ in found))
+    assert found
+    assert set((i, j) for i, j, _ in found) == brute_force(segments)
+
+
+def test_touching_segments_do_not_cross():
+    segments = [
+        ((0, 0), (10, 0)),
+        ((10, 0), (10, 10)),    # shares an end point
+        ((5, 0), (5, 10)),      # tees into the first
+        ((0, 0), (5, 0)),       # overlaps the first
+    ]
+    assert find_crossings(segments) == []
+
+
+def test_crossing_location():
+    segments = [((0, 5), (10, 5)), ((3, 0), (3, 10)), ((0, 0), (10, 10))]
+    found = sorted(find_crossings(segments))
+    assert [(i, j) for i, j, _ in found] == [(0, 1), (0, 2), (1, 2)]
+    assert found[0][2] == (3, 5)
+    assert found[1][2] == pytest.approx((5, 5))
+    assert found[2][2] == pytest.approx((3, 3))
+
+
+def test_crossings(tmp_path):
+    # wires that cross at a vertex or pin are connected, not crossed
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        h = Wire([(0, 0), (200, 0)])
+        v = Wire([(100, -100), (100, 100)])
+        Wire([(0, 200), (200, 200)])
+        Wire([(100, 150), (100, 200), (100, 250)])
+        r = Resistor(C=(100, 400), orient='v', name='R')
+        Wire([(0, r.p[1]), (200, r.p[1])])
+        Wire([(100, 250), r.p])
+        crossings = schematic.crossings()
+    assert crossings == [((100, 0), (h, 0), (v, 0))]
+
+
+@pytest.mark.parametrize('style, command', [('arc', 'A'), ('gap', 'M')])
+def test_hop_overs(tmp_path, style, command):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        h = Wire([(0, 0), (200, 0)])
+        v = Wire([(100, -100), (100, 100)])
+        crossings = schematic.add_hop_overs(style=style, radius=10)
+    assert len(crossings) == 1
+    d = h.sch_line.attribs['d']
+    assert d.count(command) == (1 if style == 'arc' else 2)
+    assert '90,0' in d and '110,0' in d
+    assert v.sch_line.attribs['points'] == '100,-100 100,100'
+
+
+def test_unknown_hop_over_style(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Wire([(0, 0), (200, 0)])
+        with pytest.raises(Error, match='unknown hop-over style'):
+            schematic.add_hop_overs(style='bridge')
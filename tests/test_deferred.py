@@ -0,0 +1,20 @@
+# Tests for deferred element construction
+
+from svg_schematic import Capacitor, Node, Resistor, Schematic, Wire
+
+
+def draw(filename, **kwargs):
+    with Schematic(filename=filename, **kwargs) as schematic:
+        r = Resistor(C=(100, 0), name='R1', value='1k')
+        c = Capacitor(p=r.p, orient='v', name='C1')
+        Wire([r.n, (0, 0), (0, c.n[1]), c.n])
+    return schematic
+
+
+def test_output_unchanged(tmp_path):
+    draw(str(tmp_path / 'immediate.svg'))
+    schematic = draw(str(tmp_path / 'deferred.svg'), deferred=True)
+    immediate = (tmp_path / 'immediate.svg').read_text()
+    assert (tmp_path / 'deferred.svg').read_text() == immediate
+    # the nodes are streamed, they are not built into svgwrite elements
+    assert any(isinstance(e, Node) for e in schematic.elements)
@@ -0,0 +1,68 @@
+# Tests for instrumentation
+
+import pytest
+import svg_schematic
+from svg_schematic import Resistor, Schematic, Tile, Wire
+
+
+def is_wrapped(method):
+    return hasattr(method, 'sch_original')
+
+
+def test_constructors_wrapped_only_while_instrumented(tmp_path):
+    assert not is_wrapped(Resistor.__init__)
+    assert not is_wrapped(Tile.set_coordinates)
+    with Schematic(filename=str(tmp_path / 'test.svg'), instrument=True) as schematic:
+        assert is_wrapped(Resistor.__init__)
+        assert is_wrapped(Tile.set_coordinates)
+        r = Resistor(C=(100, 0))
+        Resistor(C=(300, 0))
+        Wire([r.p, (200, 0)])
+    assert not is_wrapped(Resistor.__init__)
+    assert not is_wrapped(Tile.set_coordinates)
+    components = schematic.sch_instrumentation.components
+    assert components['Resistor', None]['instances'] == 2
+    assert components['Resistor', None]['bytes'] > 0
+    assert components['Wire', 'plain']['instances'] == 1
+
+
+def test_nested_schematics(tmp_path):
+    # the wrappers remain until the last instrumented schematic is closed,
+    # and only record the components of instrumented schematics
+    with Schematic(filename=str(tmp_path / 'a.svg'), instrument=True) as a:
+        Resistor(C=(100, 0))
+        with Schematic(filename=str(tmp_path / 'b.svg')) as b:
+            Resistor(C=(100, 0))
+        with Schematic(filename=str(tmp_path / 'c.svg'), instrument=True) as c:
+            Resistor(C=(100, 0))
+            Resistor(C=(300, 0))
+        assert is_wrapped(Resistor.__init__)
+        Resistor(C=(300, 0))
+    assert not is_wrapped(Resistor.__init__)
+    assert b.sch_instrumentation is None
+    assert a.sch_instrumentation.components['Resistor', None]['instances'] == 2
+    assert c.sch_instrumentation.components['Resistor', None]['instances'] == 2
+
+
+def test_component_defined_while_instrumented(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg'), instrument=True) as schematic:
+        class Load(Resistor):
+            def __init__(self, **kwargs):
+                super().__init__(**kwargs)
+        Load(C=(100, 0))
+    assert not is_wrapped(Load.__init__)
+    components = schematic.sch_instrumentation.components
+    assert components['Load', None]['instances'] == 1
+    assert ('Resistor', None) not in components
+
+
+def test_failed_close_unwraps_constructors(tmp_path):
+    filename = str(tmp_path / 'missing' / 'test.svg')
+    schematic = Schematic(filename=filename, instrument=True)
+    Resistor(C=(100, 0))
+    assert is_wrapped(Resistor.__init__)
+    with pytest.raises(OSError):
+        schematic.close()
+    assert not is_wrapped(Resistor.__init__)
+    assert not is_wrapped(Tile.set_coordinates)
+    assert svg_schematic.instrumented_schematics == 0
@@ -0,0 +1,56 @@
+# Tests for automatic junction dots
+
+from svg_schematic import Dot, Pin, Resistor, Schematic, Wire
+
+
+def dots(schematic):
+    return sorted(tuple(c.C) for c in schematic.sch_components if isinstance(c, Dot))
+
+
+def test_tee(tmp_path):
+    # a wire that tees into the middle of another gets a dot
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Wire([(0, 0), (200, 0)])
+        Wire([(100, 0), (100, 100)])
+        added = schematic.add_junction_dots()
+    assert [tuple(d.C) for d in added] == [(100, 0)]
+    assert dots(schematic) == [(100, 0)]
+
+
+def test_no_dot_at_corner_or_crossing(tmp_path):
+    # two wires that meet at a corner or cross do not get a dot
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Wire([(0, 0), (100, 0), (100, 100)])
+        Wire([(0, 50), (200, 50)])
+        added = schematic.add_junction_dots()
+    assert added == []
+
+
+def test_pin_with_two_wires(tmp_path):
+    # a component pin with two wires is a junction of three
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        r = Resistor(C=(100, 0), name='R')
+        Wire([r.p, (250, 0)])
+        Wire([r.p, (150, 100)])
+        added = schematic.add_junction_dots()
+    assert [tuple(d.C) for d in added] == [tuple(r.p)]
+
+
+def test_existing_pin_or_dot(tmp_path):
+    # no dot is added where there is already a pin or dot
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Wire([(0, 0), (200, 0)])
+        Wire([(100, 0), (100, 100)])
+        Wire([(0, 200), (200, 200)])
+        Wire([(100, 200), (100, 300)])
+        Dot(C=(100, 0))
+        Pin(C=(100, 200), kind='dot')
+        added = schematic.add_junction_dots()
+    assert added == []
+
+
+def test_auto_dots(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg'), auto_dots=True) as schematic:
+        Wire([(0, 0), (200, 0)])
+        Wire([(100, 0), (100, 100)])
+    assert dots(schematic) == [(100, 0)]
@@ -0,0 +1,61 @@
+# Tests for netlist output
+
+import json
+import pytest
+from inform import Error
+from svg_schematic import Capacitor, Ground, Resistor, Schematic, Source, Wire
+
+
+def rc(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        v = Source(C=(0, 100), orient='v', kind='vdc', name='in', value='1V')
+        r = Resistor(n=v.p, orient='h', name='1', value='1 kΩ')
+        c = Capacitor(p=r.p, orient='v', name='1', value='1nF')
+        Wire([c.p, (c.p[0], v.p[1])])
+        Ground(C=v.n)
+        Ground(C=c.n)
+    return schematic
+
+
+def test_spice(tmp_path):
+    schematic = rc(tmp_path)
+    filename = str(tmp_path / 'test.cir')
+    schematic.write_netlist(filename)
+    with open(filename, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0].startswith('* ')
+    assert lines[-1] == '.end'
+    cards = {line.split()[0]: line.split()[1:] for line in lines[1:-1]}
+    assert set(cards) == {'Vin', 'R1', 'C1'}
+    vp, vn, value = cards['Vin']
+    assert vn == '0'
+    assert value == '1V'
+    rp, rn, value = cards['R1']
+    assert value == '1kΩ'
+    assert rn == vp
+    cp, cn, value = cards['C1']
+    assert cp == rp
+    assert cn == '0'
+
+
+def test_json(tmp_path):
+    schematic = rc(tmp_path)
+    filename = str(tmp_path / 'test.json')
+    schematic.write_netlist(filename)
+    with open(filename, encoding='utf-8') as f:
+        netlist = json.load(f)
+    devices = {d['designator']: d for d in netlist['devices']}
+    assert set(devices) == {'Vin', 'R1', 'C1', 'Ground1', 'Ground2'}
+    assert devices['R1']['component'] == 'Resistor'
+    assert devices['C1']['pins']['n'] == '0'
+    nets = {n['name']: n for n in netlist['nets']}
+    ground = sorted(map(tuple, nets['0']['pins']))
+    assert ('C1', 'n') in ground
+    assert ('Vin', 'n') in ground
+    assert devices['R1']['pins']['p'] == devices['C1']['pins']['p']
+
+
+def test_unknown_format(tmp_path):
+    schematic = rc(tmp_path)
+    with pytest.raises(Error, match='unknown netlist format'):
+        schematic.write_netlist(str(tmp_path / 'test.net'), format='verilog')
@@ -0,0 +1,75 @@
+# Tests for automatic wire routing
+
+import pytest
+from inform import Error
+from svg_schematic import Box, Resistor, Schematic, Wire, _clip_segment
+
+
+def is_manhattan(points):
+    return all(
+        p[0] == q[0] or p[1] == q[1] for p, q in zip(points, points[1:])
+    )
+
+
+def passes_through(points, tile):
+    (x0, y0), (x1, y1) = tile.NW, tile.SE
+    region = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    return any(_clip_segment(p, q, region) for p, q in zip(points, points[1:]))
+
+
+def test_straight_route(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        a = Resistor(C=(0, 0), name='a')
+        b = Resistor(C=(400, 0), name='b')
+        route = schematic.route(a.p, b.n)
+    assert route == [a.p, b.n]
+
+
+def test_route_around_tile(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        a = Resistor(C=(0, 0), name='a')
+        b = Resistor(C=(400, 0), name='b')
+        box = Box(C=(200, 0), w=2, h=2)
+        wire = Wire([a.p, b.n], kind='auto')
+        connectivity = schematic.connectivity()
+        rules = set(v.rule for v in schematic.check())
+    assert wire.points[0] == a.p and wire.points[-1] == b.n
+    assert is_manhattan(wire.points)
+    assert not passes_through(wire.points, box)
+    assert connectivity.connected((a, 'p'), (b, 'n'))
+    assert not connectivity.connected((a, 'n'), (b, 'n'))
+    assert rules == {'dangling pin'}
+
+
+def test_routes_do_not_join(tmp_path):
+    # a second route may cross the first but may not join it
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        a = Resistor(C=(0, 0), name='a')
+        b = Resistor(C=(400, 0), name='b')
+        c = Resistor(C=(200, -200), orient='v', name='c')
+        d = Resistor(C=(200, 200), orient='v', name='d')
+        Wire([a.p, b.n], kind='auto')
+        wire = Wire([c.n, d.p], kind='auto')
+        connectivity = schematic.connectivity()
+    assert is_manhattan(wire.points)
+    assert connectivity.connected((c, 'n'), (d, 'p'))
+    assert not connectivity.connected((a, 'p'), (c, 'n'))
+    assert len(schematic.crossings()) == 1
+
+
+def test_route_through_several_points(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        a = Resistor(C=(0, 0), name='a')
+        b = Resistor(C=(400, 0), name='b')
+        route = schematic.route(a.p, (200, 100), b.n)
+    assert route[0] == a.p and route[-1] == b.n
+    assert (200, 100) in route
+    assert is_manhattan(route)
+
+
+def test_blocked_pin(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        a = Resistor(C=(0, 0), name='a')
+        Box(C=(100, 0), w=1, h=1)
+        with pytest.raises(Error, match='no route found'):
+            schematic.route(a.p, (500, 0))
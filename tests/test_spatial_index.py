@@ -0,0 +1,64 @@
+# Tests for the R-tree and the spatial index
+
+import random
+from svg_schematic import Capacitor, Resistor, RTree, Schematic, Wire
+
+
+def test_rtree_search_matches_brute_force():
+    rand = random.Random(1)
+    entries = []
+    for i in range(500):
+        x, y = rand.uniform(0, 1000), rand.uniform(0, 1000)
+        w, h = rand.uniform(0, 50), rand.uniform(0, 50)
+        entries.append((x, y, x + w, y + h, i))
+    tree = RTree()
+    tree.extend(entries[:200])
+    for entry in entries[200:]:
+        tree.add(entry)
+    assert len(tree) == len(entries)
+    for i in range(50):
+        x0, y0 = rand.uniform(0, 1000), rand.uniform(0, 1000)
+        x1, y1 = x0 + rand.uniform(0, 200), y0 + rand.uniform(0, 200)
+        found = sorted(e[4] for e in tree.search(x0, y0, x1, y1))
+        expected = sorted(
+            e[4] for e in entries
+            if e[0] <= x1 and e[2] >= x0 and e[1] <= y1 and e[3] >= y0
+        )
+        assert found == expected
+
+
+def test_rtree_nearest_in_order_of_distance():
+    rand = random.Random(2)
+    tree = RTree()
+    tree.extend(
+        (x, y, x, y, i) for i, (x, y) in enumerate(
+            (rand.uniform(0, 100), rand.uniform(0, 100)) for i in range(200)
+        )
+    )
+    distances = [d for d, entry in tree.nearest(50, 50)]
+    assert len(distances) == 200
+    assert distances == sorted(distances)
+
+
+def test_overlapping_and_at(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        r = Resistor(C=(100, 0))
+        c = Capacitor(C=(300, 0))
+        wire = Wire([r.p, c.W])
+        index = schematic.spatial_index()
+        assert index.overlapping((90, -10), (110, 10)) == [r]
+        assert index.at((225, 0)) == [wire]
+        assert index.overlapping((0, -10), (400, 10)) == [r, c, wire]
+
+
+def test_nearest_pin_unconnected(tmp_path):
+    # the wire runs under the resistor, so both of its pins are connected
+    with Schematic(filename=str(tmp_path / 'test.svg')) as schematic:
+        Wire([(0, 0), (200, 0)])
+        r = Resistor(C=(100, 0))
+        c = Resistor(C=(400, 0))
+        index = schematic.spatial_index()
+        assert index.nearest_pin((160, 0)) == (r, 'p')
+        assert index.nearest_pin((160, 0), unconnected=True) == (c, 'n')
+        assert index.nearest_pin((160, 0), max_distance=5) is None
+        assert index.nearest_pin((160, 0), exclude=[r]) == (c, 'n')
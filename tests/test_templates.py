@@ -0,0 +1,23 @@
+# Tests for the tile templates
+
+import pytest
+from svg_schematic import Resistor, Schematic, Tile
+
+
+def test_shared_pins_are_read_only(tmp_path):
+    with Schematic(filename=str(tmp_path / 'test.svg')):
+        a = Resistor(C=(100, 0))
+        b = Resistor(C=(300, 0))
+        assert a.pins is b.pins
+        with pytest.raises(TypeError):
+            a.pins['x'] = (0, 0)
+        assert set(b.pins) == {'p', 'n'}
+
+
+def test_template_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(Tile, '_TEMPLATE_LIMIT', 2)
+    Tile._templates.clear()
+    with Schematic(filename=str(tmp_path / 'test.svg')):
+        for i, orient in enumerate(['h', 'v', 'h|', 'v-']):
+            Resistor(C=(100*i, 0), orient=orient)
+            assert len(Tile._templates) <= 2